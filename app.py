@@ -1,27 +1,35 @@
 # Import required libraries
 import controls
-from controls import REGENCIES
-import pymongo  # dont forget dnspython add to req.txt
+from controls import REGENCIES, REGIONS, COMPARE_COUNTRIES, CASE_TYPES
+from data_store import store
+from data_source import mongo, MongoSync
+import geometry
+import instrumentation
+import profiling
+from figure_cache import figure_cache
+import views
+import warmup
+import downsample
 from dotenv import load_dotenv
 import dash_html_components as html
 import dash_core_components as dcc
 from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
-import plotly.express as px
 
 import dash
-import pickle
 import copy
+import hashlib
+import json
+import logging
 import pathlib
-import urllib.request
-import math
-import datetime as dt
 import pandas as pd
-import json
 import os
 pd.options.mode.chained_assignment = None  # default='warn'
 
+logger = logging.getLogger(__name__)
+
 ########### to-dos  ###############
 # compare w. https://public.tableau.com/profile/taufiqhs#!/vizhome/Covid-19IndonesiaByProvince/DashboardUtama
 # check learnings from Data Viz w tableau Coursera
@@ -44,26 +52,29 @@ DATA_PATH = PATH.joinpath("data").resolve()
 ###################
 load_dotenv()
 # env variables set on Heroku / for development use:
-# client = pymongo.MongoClient(os.getenv('MONGODB_URI'))
-client = pymongo.MongoClient(os.environ['MONGODB_URI'])
-db = client.bali_covid
-collection = db.bali_regency_data
-data_bali1 = pd.DataFrame(list(db.bali_regency_data.find()))
+# MONGODB_URI, the client connects on first query, see data_source.py
+# MONGODB_SYNC_INTERVAL, seconds between fetches of new daily Bali documents,
+# started with the other background tasks at the end of this file
+mongo_sync = MongoSync(mongo, store)
+# DATA_WATCH_INTERVAL, seconds between checks for newly published datasets
+# (see data_store.publish), 0 to only load them once
 
 # FROM CSV
 ###############
-# bali regencies
-data_covid_bali = DATA_PATH.joinpath('bali_regency_data.csv')
-# indo provinces (change to kawalcovid)
-data_covid_indo = DATA_PATH.joinpath('indo_province_data.csv')
+# bali regencies, indo provinces and world data are loaded once per worker
+# and kept in memory, see data_store.py
 # delete bw Data
 # data_covid_germany = DATA_PATH.joinpath('county_covid_BW.csv')
-# data comparison and indo !
-data_world = DATA_PATH.joinpath('world_data.csv')
 
 geojson_bali = DATA_PATH.joinpath('new_bali_id.geojson')
 geojson_indo = DATA_PATH.joinpath('new_indo_id.geojson')
 geojson_germany = DATA_PATH.joinpath('geojson_ger.json')
+# detail level of the map geometry, see geometry.LEVELS ('fine' or 'coarse')
+map_detail = os.getenv('MAP_DETAIL', 'fine')
+# seconds between checks of open pages for new info box numbers, 0 for none
+SUMMARY_INTERVAL = int(os.getenv('SUMMARY_INTERVAL', 600))
+# initial visible range of the count graph, sent at full resolution
+COUNT_RANGE = ('2020-12-01', '2021-04-24')
 
 # Color Model
 ################
@@ -78,6 +89,10 @@ app = dash.Dash(
     __name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}]
 )
 server = app.server
+# Server-Timing headers and Prometheus metrics at /metrics
+instrumentation.install(server, outputs=app.callback_map)
+# profiles of single callbacks on request, if PROFILE_DIR is set
+profiling.install(server)
 
 # Create controls
 # ---------------------
@@ -85,6 +100,9 @@ server = app.server
 regency_options = [
     {'label': str(REGENCIES[x]), 'value': str(REGENCIES[x])} for x in REGENCIES
 ]
+region_options = [{'label': REGIONS[x], 'value': x} for x in REGIONS]
+compare_options = [{'label': x, 'value': x} for x in COMPARE_COUNTRIES]
+case_type_options = [{'label': CASE_TYPES[x], 'value': x} for x in CASE_TYPES]
 
 # Create global chart template
 # -----------------------------
@@ -109,9 +127,14 @@ layout = dict(
 #######################
 # Create app layout
 #######################
-app.layout = html.Div(
+main_layout = html.Div(
     [
+        # info box numbers (see info_summary), shipped with the page
         dcc.Store(id="aggregate_data"),
+        # checks for new numbers, no_update while the data is the same
+        dcc.Interval(id="aggregate_interval",
+                     interval=max(SUMMARY_INTERVAL, 1) * 1000,
+                     disabled=SUMMARY_INTERVAL <= 0),
         # empty Div to trigger javascript file for graph resizing
         html.Div(id="output-clientside"),
 
@@ -162,10 +185,7 @@ app.layout = html.Div(
                         html.H6("Chooose Region:", className='control_label'),
                         dcc.RadioItems(
                             id='region_selector',
-                            options=[
-                                {'label': 'Indonesia', 'value': 'indo'},
-                                {'label': 'Bali', 'value': 'bali'},
-                            ],
+                            options=region_options,
                             labelStyle={"display": "inline-block"},
                             value="bali",
                             className="dcc_control",),
@@ -188,15 +208,7 @@ app.layout = html.Div(
                             className='control_label'),
                         dcc.Dropdown(
                             id='compare_with',
-                            options=[
-                                {'label': 'World', 'value': 'World'},
-                                {'label': 'Indonesia', 'value': 'Indonesia'},
-                                {'label': 'Australia', 'value': 'Australia'},
-                                {'label': 'Germany', 'value': 'Germany'},
-                                {'label': 'United Kingdom',
-                                    'value': 'United Kingdom'},
-                                {'label': 'Italy', 'value': 'Italy'},
-                            ],
+                            options=compare_options,
                             multi=False,
                             value='Germany',
                             clearable=False,
@@ -317,11 +329,7 @@ app.layout = html.Div(
                     html.P("Cases:", className='control_label'),
                     dcc.RadioItems(
                         id='case_type_selector',
-                        options=[
-                            {'label': 'Confirmed', 'value': 'total_cases_per_100k'},
-                            {'label': 'Recovered', 'value': 'total_recovered'},
-                            {'label': 'Deaths', 'value': 'total_deaths_per_100k'},
-                        ],
+                        options=case_type_options,
                         labelStyle={"display": "inline-block"},
                         value="total_cases_per_100k",
                         className="dcc_control",),
@@ -449,6 +457,7 @@ app.layout = html.Div(
     id="mainContainer",
     style={"display": "flex", "flex-direction": "column"},
 )
+
 ##################
 # Create callbacks
 ###################
@@ -461,23 +470,23 @@ app.clientside_callback(
 #######################################
 # Region Selector -> show Regency Option
 #######################################
-
-
-@app.callback(
+# pure UI logic runs in the browser, see assets/resizing_script.js
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside",
+                       function_name="show_regency_selector"),
     Output(component_id='regency_selector_div', component_property='style'),
     Input('region_selector', 'value')
 )
-def show_regency_selector(region):
-    if region == 'bali':
-        return {'display': 'inline-block'}  # , 'flex-direction': 'row'
-    if region == 'indo':
-        return {'display': 'none'}
+
 #######################################
 # Selector -> Mini-Container Numbers
 ######################################
-
-
-@app.callback(
+# The numbers of every region and compare country are formatted once on the
+# server (info_summary), shipped with the page in `aggregate_data` and
+# picked in the browser, so changing a selector needs no server request.
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside",
+                       function_name="update_mini_containers"),
     [
         Output("info_box_paragraph", "children"),
         Output("info_box", "children"),
@@ -495,55 +504,47 @@ def show_regency_selector(region):
     [Input('regency_selector', 'value'),
      Input('region_selector', 'value'),
      Input('compare_with', 'value'),
+     Input('aggregate_data', 'data'),
      ],
 )
-def update_mini_containers1(regency, region, compare_with):
-    # print(region)
+
+
+def region_info(regency, region):
     # first row info containers
     ############################
-    if region == 'indo':
-        df = pd.read_csv(data_world)
-        selected_region = df[df['location'].str.match('Indonesia')]
-        region_select = 'Indonesia'
-
-    elif region == 'bali' and regency == '' or regency == None:
-        df = pd.read_csv(data_covid_indo)
-        selected_region = df[df['Province'].str.match('Bali')]
-        region_select = "Bali"
+    selected = views.region_view(region, regency)
+    if selected['name'] in ('Indonesia', 'Bali'):
+        region_select = selected['name']
     else:
-        df = pd.read_csv(data_covid_bali)
-        selected_region = df[df['Name_EN'].str.match((regency.capitalize()))]
         region_select = 'Bali ' + regency
+    latest = selected['latest']
 
-    date = selected_region["Date"].iloc[-1]
-    cfr = selected_region['CFR'].iloc[-1]
+    date = latest["Date"]
+    cfr = latest['CFR']
     # cfr = cfr.apply(pd.to_numeric)  # .round(2)
-    cp100k = selected_region['total_cases_per_100k'].iloc[-1]  # .round(2)
-    dp100k = selected_region['total_deaths_per_100k'].iloc[-1]  # .round()
-    selected_region['growth_rate_new_cases'] = selected_region.loc[:, ['new_cases']].pct_change(
-        fill_method='ffill', periods=7)
-
-    growth_rate = selected_region.loc[:,
-                                      ('growth_rate_new_cases')].iloc[-1].round()
-
-    # second row info containers
-    ############################
-    df2 = pd.read_csv(data_world)
-    selected_region2 = df2[df2['location'].str.match(str(compare_with))]
-    date2 = selected_region2["Date"].iloc[-1]
-    cfr2 = selected_region2['CFR'].iloc[-1]
-    cp100k2 = selected_region2['total_cases_per_100k'].iloc[-1].round(2)
-    dp100k2 = selected_region2['total_deaths_per_100k'].iloc[-1].round(2)
-    selected_region2['growth_rate_new_cases'] = selected_region2.loc[:, ['new_cases']].pct_change(
-        fill_method='ffill', periods=7)
-    growth_rate2 = selected_region2['growth_rate_new_cases'].iloc[-1].round(2)
+    cp100k = latest['total_cases_per_100k']  # .round(2)
+    dp100k = latest['total_deaths_per_100k']  # .round()
+    # computed for all locations on load, see metrics.py
+    growth_rate = latest['growth_rate_new_cases'].round()
     return (
-        '{}'.format(str(date)),
+        '{}'.format(date.strftime('%Y-%m-%d')),
         '{}'.format(region_select),
         '{}'.format(str(round(cfr, 2))),
         '{}'.format(str(round(cp100k, 2))),
         '{}'.format(round(dp100k, 0)),
         '{}'.format(str(growth_rate) + '%'),
+    )
+
+
+def compare_info(compare_with):
+    # second row info containers
+    ############################
+    latest2 = views.compare_view(compare_with)['latest']
+    cfr2 = latest2['CFR']
+    cp100k2 = latest2['total_cases_per_100k'].round(2)
+    dp100k2 = latest2['total_deaths_per_100k'].round(2)
+    growth_rate2 = latest2['growth_rate_new_cases'].round(2)
+    return (
         '{}'.format(str(compare_with)),
         '{}'.format(str(round(cfr2, 2))),
         '{}'.format(str(round(cp100k2, 2))),
@@ -551,34 +552,116 @@ def update_mini_containers1(regency, region, compare_with):
         '{}'.format(str(growth_rate2) + '%')
     )
 
+
+def update_mini_containers1(regency, region, compare_with):
+    return region_info(regency, region) + compare_info(compare_with)
+
+
+@figure_cache.memoize
+def info_summary():
+    """Formatted info box numbers of every region, regency and compare country.
+
+    Keys of `regions` are 'indo', 'bali' and 'bali/<regency>', the lists
+    hold the outputs of `region_info` and `compare_info`. Entries whose
+    data is missing (e.g. a compare country not in the world data) are
+    None, the browser keeps the boxes as they are for them. `version` is
+    a hash of the numbers, the same in every worker.
+    """
+    regions = {'indo': _summary_entry(region_info, '', 'indo'),
+               'bali': _summary_entry(region_info, '', 'bali')}
+    for regency in REGENCIES.values():
+        regions['bali/' + regency] = _summary_entry(region_info, regency, 'bali')
+    compare = {country: _summary_entry(compare_info, country)
+               for country in COMPARE_COUNTRIES}
+    version = hashlib.sha256(json.dumps(
+        [regions, compare], sort_keys=True).encode()).hexdigest()[:16]
+    return dict(regions=regions, compare=compare, version=version)
+
+
+def _summary_entry(func, *args):
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('info box numbers of %s failed', args)
+        return None
+
+
+def serve_layout():
+    # ship the current info box numbers with every page load
+    layout = copy.copy(main_layout)
+    layout.children = [dcc.Store(id="aggregate_data", data=info_summary())] + \
+        main_layout.children[1:]
+    return layout
+
+
+@app.callback(
+    Output('aggregate_data', 'data'),
+    [Input('aggregate_interval', 'n_intervals')],
+    [State('aggregate_data', 'data')],
+    prevent_initial_call=True,
+)
+def update_summary(n_intervals, summary):
+    # open pages get the new numbers once the data changed (reloaded files,
+    # Mongo sync), the check is one cached lookup and an empty response
+    current = info_summary()
+    if summary and summary.get('version') == current['version']:
+        return dash.no_update
+    return current
+
+
+# the layout function runs for every page, not to validate the callbacks
+# when it is set, so importing the app reads no data
+app.validation_layout = main_layout
+app.layout = serve_layout
+
 ##################################
 # Selectors -> time series graph (1.st Graph)
 ###################################
 
 
+# Zooming or panning the graph (relayoutData) fetches the visible days at
+# full resolution, the other days are sent as weekly means, see downsample.py.
+# A change of the controls renders the full range again, the new figure
+# resets the zoom.
 @app.callback(
     Output("count_graph", "figure"),
     [
         Input('region_selector', 'value'),
         Input('regency_selector', 'value'),
         Input('compare_with', 'value'),
+        Input('count_graph', 'relayoutData'),
     ])
-def make_count_figure(region, regency, compare_region):
-    if region == 'indo':
-        df = pd.read_csv(data_world)   # use owid_world data
-        df = df[df['location'].str.match('Indonesia')]
-        region_selected = 'Indonesia'
-    elif region == 'bali' and regency == '' or regency == None:
-        region_selected = 'Bali'
-        df = pd.read_csv(data_covid_indo)
-        df = df[df['Province'].str.match(region_selected)]
-    else:
-        df = pd.read_csv(data_covid_bali)
-        region_selected = str(regency)
-        df = df[df['Name_EN'].str.match(region_selected)]
-    days = df.Date.to_list()
-    df_compare = pd.read_csv(data_world)
-    df_compare = df_compare[df_compare['location'].str.match(compare_region)]
+def update_count_figure(region, regency, compare_region, relayout):
+    triggered = {t['prop_id'] for t in dash.callback_context.triggered}
+    if triggered != {'count_graph.relayoutData'}:
+        return make_count_figure(region, regency, compare_region)
+    window = downsample.relayout_window(relayout)
+    if window is None:
+        # e.g. autosize, the visible range did not change
+        raise PreventUpdate
+    return make_count_figure(region, regency, compare_region, *window)
+
+
+def count_figure_key(region, regency, compare_region,
+                     start=COUNT_RANGE[0], end=COUNT_RANGE[1]):
+    # the warm-up renders the initial range without passing it
+    return region, regency, compare_region, start, end
+
+
+@figure_cache.memoize(key=count_figure_key)
+def make_count_figure(region, regency, compare_region,
+                      start=COUNT_RANGE[0], end=COUNT_RANGE[1]):
+    """Bars of the daily new cases per million of a region and a compare country.
+
+    Parameters
+    --------
+    start, end: str, 'YYYY-MM-DD' of the visible range, '' for all days
+    """
+    selected = views.region_view(region, regency)
+    df = selected['series']
+    region_selected = selected['name']
+    df_compare = views.compare_view(compare_region)['series']
+    window = (pd.Timestamp(start), pd.Timestamp(end)) if start and end else None
 
     # Graph
     #####################
@@ -595,26 +678,23 @@ def make_count_figure(region, regency, compare_region):
     selected_cases = ['new_cases_per_mil']
     for selected in selected_cases:
         name_bar = [region_selected, compare_region]
-        fig.add_trace(
-            go.Bar(
-                x=days,
-                y=df[selected],
-                marker_color=color1,
-                name=(name_bar[0]),
-            ),
-            # row=1, col=1,
-            # secondary_y=False,
-        ),
-        fig.add_trace(
-            go.Bar(
-                x=days,
-                y=df_compare['new_cases_per_million'],
-                marker_color=color_comp,
-                name=(name_bar[1]),
+        series = [(df.Date, df[selected]),
+                  (df_compare.Date, df_compare['new_cases_per_million'])]
+        for slot, (dates, values) in enumerate(series):
+            bars = downsample.points(dates, values, window)
+            x, width, offset = downsample.bar_positions(bars, slot, len(series))
+            fig.add_trace(
+                go.Bar(
+                    x=x,
+                    y=bars['value'].round(2),
+                    width=width,
+                    offset=offset,
+                    marker_color=[color1, color_comp][slot],
+                    name=(name_bar[slot]),
+                ),
+                # row=1, col=1,
+                # secondary_y=False,
             ),
-            # row=1, col=1,
-            # secondary_y=False,
-        ),
         # Line Chart
         ###############
     # selected_new = ['CFR', ]  # growth_rate_new_cases
@@ -704,9 +784,13 @@ def make_count_figure(region, regency, compare_region):
         tickfont_size=8,
         # secondary_y=True,
     )
-    # custom initial range:
-    fig.update_layout(xaxis_range=[dt.datetime(2020, 12, 1),
-                                dt.datetime(2021, 4, 24)])
+    # custom initial range: COUNT_RANGE
+    if window is not None:
+        fig.update_layout(xaxis_range=list(window))
+    # the zoom of the user is kept while the selection is the same, the
+    # window of a zoom only sets the days at full resolution (whole weeks
+    # around the visible range, see downsample.relayout_window)
+    fig.update_layout(uirevision='|'.join([region, regency or '', compare_region]))
     # rangeslider for both subplots
     fig.update_xaxes(matches='x')
 # https://community.plotly.com/t/subplot-with-shared-x-axis-and-range-slider/3148/2
@@ -724,28 +808,28 @@ def make_count_figure(region, regency, compare_region):
     Output("main_graph", "figure"),
     [Input('region_selector', 'value'),
      Input('case_type_selector', 'value')],
-    [State("main_graph", "relayoutData")],
 )
-def make_main_figure(region, case_type, main_graph_layout, ):
+@figure_cache.memoize
+def make_main_figure(region, case_type):
     ###################################
     # To-dos: add log10 for values for higher contrast
     ###################################
     PATH = pathlib.Path(__file__).parent  # no need?
     if region == 'bali':
-        df = pd.read_csv(data_covid_bali)
-        geojson = json.load(open(geojson_bali))
+        df = store.latest('bali')
+        geojson = geometry.load(geojson_bali, map_detail)
         center = {"lat": -8.5002, "lon": 115.0129}
         zoom = 7
         # color_code = 'blues'
     elif region == 'indo':
-        df = pd.read_csv(data_covid_indo)
-        geojson = json.load(open(geojson_indo))
+        df = store.latest('indo')
+        geojson = geometry.load(geojson_indo, map_detail)
         center = {'lat': 0, 'lon': 109}
         zoom = 3
         # color_code = 'viridis'
     else:
         df = pd.read_csv(data_covid_germany)
-        geojson = json.load(open(geojson_germany))
+        geojson = geometry.load(geojson_germany, map_detail)
         center = {"lat": 48.5002, "lon": 9.0129}
         zoom = 7
     if case_type == 'total_cases_per_100k':
@@ -754,6 +838,7 @@ def make_main_figure(region, case_type, main_graph_layout, ):
         color_code = 'blues'
     else:
         color_code = 'sunsetdark'
+    import plotly.express as px  # slow to import, deferred to the first map
     fig = px.choropleth_mapbox(
         df,
         geojson=geojson,
@@ -775,16 +860,11 @@ def make_main_figure(region, case_type, main_graph_layout, ):
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)',
     )
+    # pan/zoom of the user is kept by the browser as long as uirevision does
+    # not change, so the figure only depends on the inputs (and can be
+    # cached); a new region resets the view to its center and zoom
+    fig.update_layout(uirevision=region)
     display_fig = go.Figure(fig)
-    # relayoutData is None by default, and {'autosize': True} without relayout action
-    if main_graph_layout is not None:
-        if "mapbox.center" in main_graph_layout.keys():
-            lon = float(main_graph_layout["mapbox.center"]["lon"])
-            lat = float(main_graph_layout["mapbox.center"]["lat"])
-            zoom = float(main_graph_layout["mapbox.zoom"])
-            layout["mapbox"]["center"]["lon"] = lon
-            layout["mapbox"]["center"]["lat"] = lat
-            layout["mapbox"]["zoom"] = zoom
     # figure = dict(data=traces, layout=layout)
     return display_fig
 
@@ -796,12 +876,13 @@ def make_main_figure(region, case_type, main_graph_layout, ):
     [Input('region_selector', 'value'),
      Input('case_type_selector', 'value'), ]
 )
+@figure_cache.memoize
 def make_regency_info_fig(region, case_type):
     if region == 'indo':
-        df = pd.read_csv(data_covid_indo)
+        df = store.get('indo')
         region_selected = 'Indonesia'
     elif region == 'bali':
-        df = pd.read_csv(data_covid_bali)
+        df = store.get('bali')
         region_selected = 'bali'
     if case_type == "total_cases_per_100k":
         c_type = ['new_cases']
@@ -852,10 +933,10 @@ def make_regency_info_fig(region, case_type):
     Output("vacc_graph", "figure"),
     Input('compare_with', 'value')
 )
+@figure_cache.memoize
 def make_vacc_graph(compare_with):
-    df = pd.read_csv(data_world)
-    df_compare = df[df['location'].str.match(str(compare_with))].iloc[-100:]
-    df_indo = df[df['location'].str.match(str("Indonesia"))].iloc[-100:]
+    df_compare = views.compare_view(compare_with)['vaccinations']
+    df_indo = views.compare_view('Indonesia')['vaccinations']
 
     if compare_with == "Indonesia":
         dfs = [df_indo]
@@ -911,21 +992,15 @@ def make_vacc_graph(compare_with):
     Output("fun_facts", "children"),
     [Input('compare_with', 'value'), ]
 )
+@figure_cache.memoize
 def fun_facts(compare_with):
     # print(compare_with)
     ###############################
     # Add 'handwashing_facilities', 'hospital_beds_per_thousand',
     #  'life_expectancy', 'human_development_index', 'stringency_index', 'gdp_per_capita', 'extreme_poverty', 'cardiovasc_death_rate',
-    data_world1 = pd.read_csv(data_world)
-    data_world1 = data_world1[['Date', 'location', 'median_age',
-                            'aged_65_older', 'male_smokers', 'female_smokers', 'diabetes_prevalence']]
-    indo_fun = data_world1[data_world1['location'].str.match(
-        'Indonesia')].iloc[-1:]
-    compare_fun = data_world1[data_world1['location'].str.match(
-        compare_with)].iloc[-1:]
-    # print(compare_fun.head())
-    indo_fun = indo_fun.round(1)
-    compare_fun = compare_fun.round(1)
+    # see views.FUN_FACT_COLUMNS
+    indo_fun = views.compare_view('Indonesia')['fun_facts']
+    compare_fun = views.compare_view(compare_with)['fun_facts']
     # print(compare_fun.head())
 
     indoT = indo_fun.T
@@ -945,6 +1020,48 @@ def fun_facts(compare_with):
     return table
 
 
+# Preload and background tasks
+# WARMUP=1 pre-renders all callback outputs (WARMUP_PROCESSES=n for a pool in
+# the preload, later warm-ups run in a thread of the worker)
+def preload():
+    """Loads data and map geometry, and warms up the figure cache if WARMUP is set.
+
+    Called before gunicorn forks the workers (see gunicorn.conf.py), which
+    then share these objects copy-on-write instead of loading their own.
+    """
+    store.preload()
+    for geojson in (geojson_bali, geojson_indo):
+        geometry.load(geojson, map_detail)
+    import plotly.express  # deferred by make_main_figure
+    if os.getenv('WARMUP'):
+        warmup.warm_up(__name__, int(os.getenv('WARMUP_PROCESSES', 0)))
+
+
+def start_background_tasks(warm_up=True):
+    """Starts the threads of a worker, data reloads, the Mongo sync and the warm-up.
+
+    Threads do not survive a fork, gunicorn calls this in every worker.
+
+    Parameters
+    --------
+    warm_up: bool, False if the cache was warmed up before the fork, it is
+        then only rendered again after the data changed
+    """
+    watch_interval = float(os.getenv('DATA_WATCH_INTERVAL', 5))
+    if watch_interval > 0:
+        store.watch(watch_interval)
+    if os.getenv('MONGODB_URI') and os.getenv('MONGODB_SYNC_INTERVAL'):
+        mongo_sync.start(int(os.getenv('MONGODB_SYNC_INTERVAL')))
+    if os.getenv('WARMUP'):
+        warmup.start(__name__, now=warm_up)
+
+
+# gunicorn.conf.py sets APP_PRELOAD when the app is imported before the fork
+if os.getenv('APP_PRELOAD'):
+    preload()
+else:
+    start_background_tasks()
+
 # Main
 if __name__ == "__main__":
     app.run_server(debug=True)
@@ -9,5 +9,24 @@ window.dash_clientside.clientside = {
       console.log("fired resize");
     }, 500);
     return null;
+  },
+  show_regency_selector: function(region) {
+    if (region === "bali") {
+      return {"display": "inline-block"};
+    }
+    return {"display": "none"};
+  },
+  // picks the info box numbers of the selection from the summary shipped
+  // with the page (see info_summary in app.py), null entries keep the boxes
+  update_mini_containers: function(regency, region, compare_with, summary) {
+    var no_update = window.dash_clientside.no_update;
+    if (!summary) {
+      return Array(11).fill(no_update);
+    }
+    var key = region === "indo" ? "indo" : (regency ? "bali/" + regency : "bali");
+    var region_info = summary.regions[key];
+    var compare_info = summary.compare[compare_with];
+    return (region_info || Array(6).fill(no_update)).concat(
+      compare_info || Array(5).fill(no_update));
   }
 };
@@ -0,0 +1,172 @@
+# Latency, peak memory and payload size of every callback of app.py
+#
+#   python -m benchmarks.callbacks [--days N] [--countries N] [--regencies N]
+#                                  [--repeat N] [--cold] [--out FILE] [--compare FILE]
+#
+# Callbacks are called directly (without the figure cache) for every
+# combination of the controls, on synthetic data (see synthetic.py) or on
+# the datasets of --data. Results are written as JSON, --compare prints the
+# change against an earlier result file.
+import argparse
+import datetime as dt
+import importlib
+import itertools
+import json
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks import synthetic
+from controls import REGENCIES, REGIONS, COMPARE_COUNTRIES
+from data_store import store
+
+RESULTS_PATH = pathlib.Path(__file__).parent.joinpath('results')
+PERCENTILES = [50, 90, 99]
+
+
+def combinations():
+    """Yields (callback name, args) for every callback and control combination."""
+    import warmup
+    for name, args in warmup.combinations():
+        yield name, args
+    regencies = ['', None] + list(REGENCIES.values())
+    for regency, region, compare_with in itertools.product(
+            regencies, REGIONS, COMPARE_COUNTRIES):
+        yield 'update_mini_containers1', (regency, region, compare_with)
+
+
+def run(repeat=5, cold=False):
+    """Benchmarks the callbacks of app.py on the datasets of `store`.
+
+    Parameters
+    --------
+    repeat: int, calls of every combination for the latency
+    cold: bool, clear the per-selection views (see views.py) before every
+        call, so shared work is counted in every callback
+
+    Returns
+    --------
+    dict, callback name -> statistics
+    """
+    started = time.perf_counter()
+    app = importlib.import_module('app')
+    import_seconds = time.perf_counter() - started
+    import views
+    from figure_cache import to_json
+
+    jobs = list(combinations())
+    samples = {}
+    for name, args in jobs:
+        callback = getattr(app, name)
+        callback = getattr(callback, '__wrapped__', callback)
+        sample = samples.setdefault(
+            name, dict(latency=[], peak_memory=[], payload=[]))
+        for _ in range(repeat):
+            if cold:
+                views.view_cache.clear()
+            started = time.perf_counter()
+            output = callback(*args)
+            sample['latency'].append(time.perf_counter() - started)
+        sample['payload'].append(len(to_json(output)))
+
+        # separate call, tracemalloc slows down the allocations
+        if cold:
+            views.view_cache.clear()
+        tracemalloc.start()
+        callback(*args)
+        sample['peak_memory'].append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    results = dict(import_seconds=import_seconds, callbacks={})
+    for name, sample in samples.items():
+        latency = np.array(sample['latency']) * 1000
+        stats = dict(
+            calls=len(latency),
+            mean_ms=float(latency.mean()),
+            max_ms=float(latency.max()),
+            peak_memory_bytes=int(max(sample['peak_memory'])),
+            payload_bytes_mean=float(np.mean(sample['payload'])),
+            payload_bytes_max=int(max(sample['payload'])),
+        )
+        for q in PERCENTILES:
+            stats['p{}_ms'.format(q)] = float(np.percentile(latency, q))
+        results['callbacks'][name] = stats
+    return results
+
+
+def environment():
+    import dash
+    import pandas
+    import plotly
+    return dict(
+        python=platform.python_version(),
+        numpy=np.__version__,
+        pandas=pandas.__version__,
+        plotly=plotly.__version__,
+        dash=dash.__version__,
+        machine=platform.machine(),
+    )
+
+
+def report(results, previous=None):
+    """Prints a table of `results`, with the change against `previous`."""
+    columns = ['p50_ms', 'p90_ms', 'p99_ms', 'peak_memory_bytes', 'payload_bytes_max']
+    print('{:<26}'.format('callback') + ''.join('{:>18}'.format(c) for c in columns))
+    for name, stats in results['callbacks'].items():
+        line = '{:<26}'.format(name)
+        before = (previous or {}).get('callbacks', {}).get(name)
+        for column in columns:
+            cell = '{:.1f}'.format(stats[column])
+            if before and before.get(column):
+                cell += ' ({:+.0%})'.format(stats[column] / before[column] - 1)
+            line += '{:>18}'.format(cell)
+        print(line)
+    print('import of app.py: {:.2f} s'.format(results['import_seconds']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks the callbacks of app.py.')
+    parser.add_argument('--data', help='directory with the datasets, '
+                        'default: synthetic data of the size below')
+    parser.add_argument('--days', type=int, default=synthetic.DAYS)
+    parser.add_argument('--countries', type=int, default=0)
+    parser.add_argument('--regencies', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cold', action='store_true')
+    parser.add_argument('--out', help='result file, default: results/<date>.json')
+    parser.add_argument('--compare', help='earlier result file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.data:
+            store.data_path = pathlib.Path(args.data)
+            rows = None
+        else:
+            store.data_path = pathlib.Path(tmp)
+            rows = synthetic.generate(tmp, args.days, args.countries, args.regencies)
+        results = run(args.repeat, args.cold)
+
+    results.update(
+        created=dt.datetime.now().isoformat(timespec='seconds'),
+        environment=environment(),
+        parameters=dict(data=args.data, days=args.days, countries=args.countries,
+                        regencies=args.regencies, rows=rows,
+                        repeat=args.repeat, cold=args.cold),
+    )
+    out = pathlib.Path(args.out) if args.out else RESULTS_PATH.joinpath(
+        dt.datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+    report(results, previous)
+    print('results written to', out, file=sys.stderr)
@@ -0,0 +1,370 @@
+# HTTP load test of the dashboard
+#
+#   python -m benchmarks.load [--workers 1,2,4] [--concurrency 1,4,16]
+#                             [--duration S] [--days N] [--countries N] [--mongod PATH]
+#
+# Starts gunicorn (see gunicorn.conf.py) on synthetic data for every worker
+# count, and lets `concurrency` simulated visitors click through the controls
+# for `duration` seconds. Every interaction posts the server-side callbacks
+# depending on the changed control to /_dash-update-component, in parallel
+# like the browser does. Throughput, latency percentiles and error rate are
+# reported per callback, and written as JSON like callbacks.py.
+#
+# With a `mongod` binary (on PATH or --mongod) a temporary local database is
+# started and seeded with the last days of the Bali data, which the server
+# then fetches with its MongoSync thread (MONGODB_SYNC_INTERVAL=--sync).
+# --mongo-uri uses an existing database instead, without one the test runs
+# on the files only.
+import argparse
+import datetime as dt
+import json
+import os
+import pathlib
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from controls import REGENCIES, COMPARE_COUNTRIES, CASE_TYPES
+from data_store import DATASETS, COLUMNS, dataset_path, read_dataset, write_dataset
+
+PATH = pathlib.Path(__file__).parent.parent
+RESULTS_PATH = pathlib.Path(__file__).parent.joinpath('results')
+PERCENTILES = [50, 95, 99]
+# parallel requests of one visitor, like the connection limit of browsers
+BROWSER_CONNECTIONS = 6
+# days of Bali data only in the database, fetched by the sync
+SYNC_DAYS = 7
+
+
+def interactions(rng, days=synthetic.DAYS):
+    """Yields the control changes of a visitor, as dicts (id, property) -> value.
+
+    Zooms stay within the `days` days of the synthetic data.
+    """
+    region = 'bali'
+    while True:
+        action = rng.choice(['region', 'regency', 'compare', 'case_type', 'zoom'])
+        if action == 'region':
+            region = 'indo' if region == 'bali' else 'bali'
+            yield {('region_selector', 'value'): region}
+        elif action == 'regency':
+            if region != 'bali':
+                region = 'bali'
+                yield {('region_selector', 'value'): region}
+            yield {('regency_selector', 'value'):
+                   rng.choice([''] + list(REGENCIES.values()))}
+        elif action == 'compare':
+            yield {('compare_with', 'value'): rng.choice(COMPARE_COUNTRIES)}
+        elif action == 'case_type':
+            yield {('case_type_selector', 'value'): rng.choice(list(CASE_TYPES))}
+        else:
+            # range of the count graph, like the 1m/6m buttons or the slider
+            end = pd.Timestamp(synthetic.FIRST_DATE) + pd.Timedelta(
+                days=rng.randrange(30, max(31, days)))
+            start = end - pd.Timedelta(days=rng.choice([30, 182]))
+            yield {('count_graph', 'relayoutData'): {
+                'xaxis.range[0]': str(start), 'xaxis.range[1]': str(end)}}
+
+
+class Dashboard:
+    """Client of a running dashboard, fires callbacks like the browser.
+
+    Parameters
+    --------
+    url: str, root url of the app
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.callbacks = [dependency for dependency in self._get('/_dash-dependencies')
+                          if not dependency.get('clientside_function')]
+        self.initial = {}
+        _component_values(self._get('/_dash-layout'), self.initial)
+
+    def session(self, rng, deadline, record, days=synthetic.DAYS):
+        """Loads the page and changes controls until `deadline`.
+
+        `record(callback, seconds, status, size)` is called for every request.
+        """
+        values = dict(self.initial)
+        with ThreadPoolExecutor(BROWSER_CONNECTIONS) as pool:
+            self._fire(pool, self.callbacks, values, None, record)
+            for change in interactions(rng, days):
+                if time.time() >= deadline:
+                    break
+                values.update(change)
+                changed = set(change)
+                callbacks = [c for c in self.callbacks if changed & {
+                    (i['id'], i['property']) for i in c['inputs']}]
+                self._fire(pool, callbacks, values, changed, record)
+
+    def _fire(self, pool, callbacks, values, changed, record):
+        futures = [pool.submit(self._post, callback, values, changed, record)
+                   for callback in callbacks]
+        for future in futures:
+            future.result()
+
+    def _post(self, callback, values, changed, record):
+        output = callback['output']
+        outputs = [dict(zip(['id', 'property'], o.rsplit('.', 1)))
+                   for o in output.strip('.').split('...')]
+        body = dict(
+            output=output,
+            outputs=outputs if output.startswith('..') else outputs[0],
+            inputs=[dict(i, value=values.get((i['id'], i['property'])))
+                    for i in callback['inputs']],
+            state=[dict(s, value=values.get((s['id'], s['property'])))
+                   for s in callback.get('state', [])],
+            changedPropIds=['{}.{}'.format(*c) for c in changed or []],
+        )
+        request = urllib.request.Request(
+            self.url + '/_dash-update-component', json.dumps(body).encode(),
+            {'Content-Type': 'application/json'})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                size = len(response.read())
+                status = response.status
+        except urllib.error.HTTPError as e:
+            size, status = 0, e.code
+        except OSError:
+            size, status = 0, None
+        record(output, time.perf_counter() - started, status, size)
+
+    def _get(self, path):
+        with urllib.request.urlopen(self.url + path, timeout=60) as response:
+            return json.load(response)
+
+
+def _component_values(node, values):
+    # (id, property) -> value of all components of a layout
+    if isinstance(node, list):
+        for child in node:
+            _component_values(child, values)
+    elif isinstance(node, dict):
+        props = node.get('props', {})
+        if 'id' in props and isinstance(props['id'], str):
+            for key, value in props.items():
+                if key not in ('children', 'id'):
+                    values[(props['id'], key)] = value
+        _component_values(props.get('children'), values)
+
+
+def load_test(url, concurrency, duration, seed=0, days=synthetic.DAYS):
+    """Runs `concurrency` visitors against `url` for `duration` seconds.
+
+    `days` is the number of days of the served data.
+
+    Returns
+    --------
+    dict, callback output -> statistics
+    """
+    dashboard = Dashboard(url)
+    samples = {}
+    lock = threading.Lock()
+
+    def record(callback, seconds, status, size):
+        with lock:
+            samples.setdefault(callback, []).append((seconds, status, size))
+
+    started = time.time()
+    deadline = started + duration
+    threads = [threading.Thread(
+        target=dashboard.session,
+        args=(random.Random(seed + i), deadline, record, days))
+        for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    results = {}
+    for callback, sample in sorted(samples.items()):
+        latency = np.array([s[0] for s in sample]) * 1000
+        errors = sum(1 for s in sample if s[1] not in (200, 204))
+        stats = dict(
+            requests=len(sample),
+            throughput_rps=len(sample) / elapsed,
+            error_rate=errors / len(sample),
+            mean_ms=float(latency.mean()),
+            max_ms=float(latency.max()),
+            payload_bytes_mean=float(np.mean([s[2] for s in sample])),
+        )
+        for q in PERCENTILES:
+            stats['p{}_ms'.format(q)] = float(np.percentile(latency, q))
+        results[callback] = stats
+    return results
+
+
+class Server:
+    """gunicorn serving app.py with `workers` workers, as a context manager."""
+
+    def __init__(self, workers, env, port=None):
+        self.port = port or _free_port()
+        self.url = 'http://127.0.0.1:{}'.format(self.port)
+        self.env = dict(os.environ, WEB_CONCURRENCY=str(workers), **env)
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+             '--bind', '127.0.0.1:{}'.format(self.port), 'app:server'],
+            cwd=PATH, env=self.env)
+        _wait(lambda: urllib.request.urlopen(self.url, timeout=5).close(),
+              self.process, 'gunicorn')
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(30)
+
+
+class LocalMongo:
+    """Temporary mongod on a free port, as a context manager."""
+
+    def __init__(self, mongod, path):
+        self.mongod = mongod
+        self.path = pathlib.Path(path)
+        self.port = _free_port()
+        self.uri = 'mongodb://127.0.0.1:{}/'.format(self.port)
+        self.process = None
+
+    def __enter__(self):
+        import pymongo
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.process = subprocess.Popen(
+            [self.mongod, '--dbpath', str(self.path), '--port', str(self.port),
+             '--bind_ip', '127.0.0.1', '--quiet'], stdout=subprocess.DEVNULL)
+        client = pymongo.MongoClient(self.uri, serverSelectionTimeoutMS=1000)
+        _wait(lambda: client.admin.command('ping'), self.process, 'mongod')
+        client.close()
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(30)
+
+
+def seed_mongo(uri, data_path, days=SYNC_DAYS):
+    """Inserts the Bali dataset into the database and cuts its last `days` days from the file.
+
+    The documents go to the collection read by data_source.mongo, the
+    server has to sync the missing days from there.
+    """
+    import pymongo
+    path = data_path.joinpath(DATASETS['bali'])
+    frame = read_dataset(dataset_path(path), COLUMNS['bali'])
+    first = frame['Date'].max() - dt.timedelta(days=days - 1)
+    client = pymongo.MongoClient(uri)
+    collection = client['bali_covid']['bali_regency_data']
+    collection.delete_many({})
+    documents = frame.astype(object).where(frame.notna(), None)
+    collection.insert_many(documents.to_dict('records'))
+    client.close()
+    write_dataset(frame[frame['Date'] < first], path)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait(check, process, name, timeout=300):
+    deadline = time.time() + timeout
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError('{} exited with {}'.format(name, process.returncode))
+        try:
+            check()
+            return
+        except Exception:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def report(results):
+    columns = ['requests', 'throughput_rps', 'error_rate', 'p50_ms', 'p95_ms', 'p99_ms']
+    print('{:>8}{:>12}  {:<30}'.format('workers', 'concurrency', 'callback')
+          + ''.join('{:>15}'.format(c) for c in columns))
+    for run in results['runs']:
+        for callback, stats in run['callbacks'].items():
+            print('{:>8}{:>12}  {:<30}'.format(
+                run['workers'], run['concurrency'], callback[:30])
+                + ''.join('{:>15.2f}'.format(stats[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test of the dashboard.')
+    parser.add_argument('--workers', default='1,2')
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--days', type=int, default=synthetic.DAYS)
+    parser.add_argument('--countries', type=int, default=0)
+    parser.add_argument('--regencies', type=int, default=0)
+    parser.add_argument('--mongod', default=shutil.which('mongod'),
+                        help='mongod binary of the local database')
+    parser.add_argument('--mongo-uri', help='existing database instead of mongod')
+    parser.add_argument('--sync', type=int, default=10,
+                        help='MONGODB_SYNC_INTERVAL of the server')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='result file, default: results/load-<date>.json')
+    args = parser.parse_args()
+
+    results = dict(
+        created=dt.datetime.now().isoformat(timespec='seconds'),
+        parameters=vars(args), runs=[])
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = pathlib.Path(tmp).joinpath('data')
+        results['parameters']['rows'] = synthetic.generate(
+            data_path, args.days, args.countries, args.regencies)
+        env = dict(DATA_PATH=str(data_path))
+
+        mongo = None
+        if args.mongo_uri:
+            uri = args.mongo_uri
+        elif args.mongod:
+            mongo = LocalMongo(args.mongod, pathlib.Path(tmp).joinpath('db')).__enter__()
+            uri = mongo.uri
+        else:
+            uri = None
+            print('no mongod found, testing without database', file=sys.stderr)
+        try:
+            if uri:
+                seed_mongo(uri, data_path)
+                env.update(MONGODB_URI=uri, MONGODB_SYNC_INTERVAL=str(args.sync))
+            for workers in map(int, args.workers.split(',')):
+                with Server(workers, env) as server:
+                    for concurrency in map(int, args.concurrency.split(',')):
+                        print('workers {}, concurrency {}'.format(workers, concurrency),
+                              file=sys.stderr)
+                        results['runs'].append(dict(
+                            workers=workers, concurrency=concurrency,
+                            callbacks=load_test(server.url, concurrency,
+                                                args.duration, args.seed,
+                                                args.days)))
+        finally:
+            if mongo is not None:
+                mongo.__exit__()
+
+    out = pathlib.Path(args.out) if args.out else RESULTS_PATH.joinpath(
+        dt.datetime.now().strftime('load-%Y%m%d-%H%M%S') + '.json')
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    report(results)
+    print('results written to', out, file=sys.stderr)
@@ -0,0 +1,130 @@
+# Startup time of the app, with the import time of every module
+#
+#   python -m benchmarks.startup [--repeat N] [--budget SECONDS] [--top N] [--out FILE]
+#
+# Imports app.py in fresh interpreters (`python -X importtime`) on synthetic
+# data (see synthetic.py), like a restarted dyno. Reports the median wall
+# time of the import, and the modules taking most of it. Exits with 1 if the
+# median exceeds --budget, or if the import read a dataset (they are loaded
+# on first use, see data_store.py).
+import argparse
+import datetime as dt
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import synthetic
+
+PATH = pathlib.Path(__file__).parent.parent
+RESULTS_PATH = pathlib.Path(__file__).parent.joinpath('results')
+# measured in the child, the interpreter start itself is not counted, then
+# the datasets loaded by the import
+SCRIPT = ('import time; started = time.perf_counter(); import app; '
+          'print(time.perf_counter() - started); '
+          'print(",".join(sorted(app.store.memory_usage())))')
+
+
+def measure(data_path, env=None):
+    """Imports app.py once in a new interpreter.
+
+    Returns
+    --------
+    seconds: float, wall time of the import
+    loaded: list of the names of the datasets read during the import
+    modules: list of dict, name, depth, self and cumulative seconds of every
+        imported module, as reported by -X importtime
+    """
+    env = dict(os.environ, DATA_PATH=str(data_path), **(env or {}))
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+        cwd=PATH, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    seconds, loaded = process.stdout.splitlines()[-2:]
+    return float(seconds), [n for n in loaded.split(',') if n], parse(process.stderr)
+
+
+def parse(importtime):
+    """Parses the output of -X importtime."""
+    modules = []
+    for line in importtime.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append(dict(
+            name=name.strip(),
+            depth=(len(name) - len(name.lstrip()) - 1) // 2,
+            self=int(self_us) / 1e6,
+            cumulative=int(cumulative_us) / 1e6,
+        ))
+    return modules
+
+
+def breakdown(modules, top=15):
+    """Returns the `top` (module, cumulative seconds) imported by app.py.
+
+    Modules of the app itself are expanded into the modules they import.
+    """
+    own = {p.stem for p in PATH.glob('*.py')}
+    totals = {}
+    parents = []
+    # -X importtime lists the imports of a module before the module
+    for m in reversed(modules):
+        del parents[m['depth']:]
+        parents.append(m['name'])
+        if (m['depth'] and parents[0] == 'app' and m['name'] not in own
+                and all(parent in own for parent in parents[:-1])):
+            totals[m['name']] = m['cumulative']
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Startup time of app.py.')
+    parser.add_argument('--data', help='directory with the datasets, '
+                        'default: synthetic data')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, help='seconds')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--out', help='result file, default: results/startup-<date>.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = args.data or tmp
+        if not args.data:
+            synthetic.generate(tmp)
+        runs = [measure(data_path) for _ in range(args.repeat)]
+
+    seconds = [run[0] for run in runs]
+    median = statistics.median(seconds)
+    # breakdown of the run with the median time
+    modules = sorted(runs, key=lambda run: run[0])[len(runs) // 2][2]
+    loaded = sorted({name for run in runs for name in run[1]})
+    app_module = next(m for m in modules if m['name'] == 'app')
+    top = breakdown(modules, args.top)
+
+    print('import of app.py: median {:.2f} s, min {:.2f} s, max {:.2f} s'.format(
+        median, min(seconds), max(seconds)))
+    for name, cumulative in [('app.py itself', app_module['self'])] + top:
+        print('  {:<40}{:>8.3f}'.format(name, cumulative))
+
+    out = pathlib.Path(args.out) if args.out else RESULTS_PATH.joinpath(
+        dt.datetime.now().strftime('startup-%Y%m%d-%H%M%S') + '.json')
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(dict(
+            created=dt.datetime.now().isoformat(timespec='seconds'),
+            seconds=seconds, median=median, budget=args.budget,
+            app_self=app_module['self'], loaded=loaded, modules=dict(top)),
+            f, indent=2)
+    print('results written to', out, file=sys.stderr)
+
+    if loaded:
+        print('the import read the datasets', ', '.join(loaded), file=sys.stderr)
+        sys.exit(1)
+    if args.budget is not None and median > args.budget:
+        print('startup {:.2f} s over the budget of {:.2f} s'.format(
+            median, args.budget), file=sys.stderr)
+        sys.exit(1)
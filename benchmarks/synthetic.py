@@ -0,0 +1,128 @@
+# Synthetic datasets for the benchmarks, in the layout of data_store.py
+#
+#   python -m benchmarks.synthetic OUT_DIR [--days N] [--countries N] [--regencies N] [--csv]
+import argparse
+import json
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from controls import REGENCIES, COMPARE_COUNTRIES
+from data_store import DATASETS, COLUMNS, write_dataset
+
+PATH = pathlib.Path(__file__).parent.parent
+DATA_PATH = PATH.joinpath("data").resolve()
+
+# first day and number of days of every location
+FIRST_DATE = '2020-03-01'
+DAYS = 450
+
+
+def generate(out, days=DAYS, countries=0, regencies=0, csv=False, seed=0):
+    """Writes bali, indo and world datasets of the given size to `out`.
+
+    The regencies of the Bali map, the provinces of the Indonesia map and
+    the compare countries of the controls are always included, so every
+    control combination of the app has data.
+
+    Parameters
+    --------
+    out: directory to write to, used as `DataStore.data_path`
+    days: int, days of every location, starting at `FIRST_DATE`
+    countries: int, world locations added to the compare countries
+    regencies: int, Bali locations added to the regencies (without map shape)
+    csv: bool, also write CSV files next to the Parquet files
+    seed: int, seed of the random numbers
+
+    Returns
+    --------
+    dict, dataset name -> number of rows
+    """
+    out = pathlib.Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(FIRST_DATE, periods=days)
+
+    bali_geojson = _read_geojson('new_bali_id.geojson')
+    bali = []
+    for name in REGENCIES.values():
+        id_ = next(f['id'] for f in bali_geojson['features']
+                   if f['properties']['ADM2_EN'].endswith(name))
+        bali.append(dict(Name_EN=name, id=int(id_),
+                         population_2015=rng.uniform(150, 900)))
+    for i in range(regencies):
+        bali.append(dict(Name_EN='Regency {}'.format(i), id=100 + i,
+                         population_2015=rng.uniform(150, 900)))
+
+    indo_geojson = _read_geojson('new_indo_id.geojson')
+    indo = [dict(Province=f['properties']['state'],
+                 Name_EN=f['properties']['state'], id=f['id'],
+                 Population=int(rng.uniform(1e6, 5e7)))
+            for f in indo_geojson['features']]
+
+    world = [dict(location=name) for name in COMPARE_COUNTRIES]
+    world += [dict(location='Country {}'.format(i)) for i in range(countries)]
+    for location in world:
+        location.update(
+            population=float(rng.uniform(1e6, 3e8)),
+            median_age=rng.uniform(20, 45), aged_65_older=rng.uniform(3, 25),
+            male_smokers=rng.uniform(10, 50), female_smokers=rng.uniform(1, 30),
+            diabetes_prevalence=rng.uniform(3, 12))
+
+    frames = dict(
+        bali=_series(bali, dates, rng, 100),
+        indo=_series(indo, dates, rng, 1000),
+        world=_world(_series(world, dates, rng, 100000), rng),
+    )
+    rows = {}
+    for name, frame in frames.items():
+        frame = frame[[c for c in COLUMNS[name] if c in frame]]
+        write_dataset(frame, out.joinpath(DATASETS[name]), csv=csv)
+        rows[name] = len(frame)
+    return rows
+
+
+def _read_geojson(name):
+    with open(DATA_PATH.joinpath(name), 'r') as f:
+        return json.load(f)
+
+
+def _series(locations, dates, rng, scale):
+    # random daily counts and their totals, one block of rows per location
+    frames = []
+    for location in locations:
+        n = len(dates)
+        new_cases = rng.poisson(scale * rng.uniform(0.2, 1), n)
+        new_deaths = rng.binomial(new_cases, 0.03)
+        new_recovered = rng.binomial(new_cases, 0.9)
+        frame = pd.DataFrame(dict(
+            Date=dates,
+            new_cases=new_cases, total_cases=new_cases.cumsum(),
+            new_deaths=new_deaths, total_deaths=new_deaths.cumsum(),
+            new_recovered=new_recovered, total_recovered=new_recovered.cumsum(),
+        ))
+        for key, value in location.items():
+            frame[key] = value
+        frames.append(frame)
+    # the real files are sorted by date
+    return pd.concat(frames).sort_values('Date', kind='mergesort').reset_index(drop=True)
+
+
+def _world(frame, rng):
+    n = len(frame)
+    frame['new_cases_per_million'] = frame['new_cases'] / frame['population'] * 1e6
+    frame['new_vaccinations_smoothed_per_million'] = rng.uniform(0, 5000, n)
+    frame['people_fully_vaccinated_per_hundred'] = rng.uniform(0, 60, n)
+    return frame
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Writes synthetic datasets.')
+    parser.add_argument('out', help='output directory')
+    parser.add_argument('--days', type=int, default=DAYS)
+    parser.add_argument('--countries', type=int, default=0)
+    parser.add_argument('--regencies', type=int, default=0)
+    parser.add_argument('--csv', action='store_true')
+    args = parser.parse_args()
+    print(generate(args.out, args.days, args.countries, args.regencies, args.csv))
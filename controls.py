@@ -1,7 +1,6 @@
 
 # In[]:
 # Controls for webapp
-import numpy as np
 
 ## since fitbounds='location not working
 # from https://stackoverflow.com/questions/63787612/plotly-automatic-zooming-for-mapbox-maps
@@ -36,6 +35,8 @@ def zoom_center(lons: tuple=None, lats: tuple=None, lonlats: tuple=None,
     ...     (25.587101, 31.784620)))
     (5.75, {'lon': -106.208423, 'lat': 28.685861})
     """
+    import numpy as np  # only needed here, not at import of the controls
+
     if lons is None and lats is None:
         if isinstance(lonlats, tuple):
             lons, lats = zip(*lonlats)
@@ -83,4 +84,24 @@ REGENCIES = dict(
     GIA = 'Gianyar',
     KAR = 'Karangasem',
     BAN = 'Bangli',
-    )
\ No newline at end of file
+    )
+
+REGIONS = dict(
+    indo = 'Indonesia',
+    bali = 'Bali',
+    )
+
+COMPARE_COUNTRIES = [
+    'World',
+    'Indonesia',
+    'Australia',
+    'Germany',
+    'United Kingdom',
+    'Italy',
+    ]
+
+CASE_TYPES = dict(
+    total_cases_per_100k = 'Confirmed',
+    total_recovered = 'Recovered',
+    total_deaths_per_100k = 'Deaths',
+    )
@@ -0,0 +1,194 @@
+# MongoDB Atlas data source for the webapp
+import datetime as dt
+import logging
+import os
+import threading
+
+import pandas as pd
+
+import metrics
+from data_store import COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# columns of bali_regency_data used by the dashboard
+BALI_COLUMNS = COLUMNS['bali']
+
+class MongoSource:
+    """Lazily connected, pooled access to one MongoDB collection.
+
+    No connection is opened until the first query, so importing the app
+    does not depend on the database. The client (and its connection pool)
+    is shared by all threads of a worker.
+
+    Parameters
+    --------
+    uri: str, connection string, defaults to env variable MONGODB_URI
+    database: str, name of the database
+    collection: str, name of the collection
+    max_pool_size: int, connections kept per worker
+    batch_size: int, documents fetched per round trip and per DataFrame chunk
+    """
+
+    def __init__(self, uri=None, database='bali_covid',
+                 collection='bali_regency_data', max_pool_size=10,
+                 batch_size=1000):
+        self.uri = uri
+        self.database = database
+        self.collection_name = collection
+        self.max_pool_size = max_pool_size
+        self.batch_size = batch_size
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # imported on first use, the app starts without it
+                    import pymongo  # dont forget dnspython add to req.txt
+                    uri = self.uri or os.environ['MONGODB_URI']
+                    self._client = pymongo.MongoClient(
+                        uri, maxPoolSize=self.max_pool_size, connect=False)
+        return self._client
+
+    @property
+    def collection(self):
+        return self.client[self.database][self.collection_name]
+
+    def find_frame(self, columns=None, start=None, end=None, days=None,
+                   after=None):
+        """Returns the documents of the collection as a DataFrame.
+
+        Parameters
+        --------
+        columns: list, fields to fetch, defaults to `BALI_COLUMNS`
+        start: datetime, optional, only documents with `Date` >= start
+        end: datetime, optional, only documents with `Date` < end
+        days: int, optional, only the last `days` days before `end` (or now),
+            ignored if `start` is given
+        after: datetime, optional, only documents with `Date` > after
+        """
+        columns = BALI_COLUMNS if columns is None else columns
+        if start is None and days is not None:
+            start = (end or dt.datetime.now()) - dt.timedelta(days=days)
+        query = {}
+        if start is not None or end is not None or after is not None:
+            query['Date'] = {}
+            if start is not None:
+                query['Date']['$gte'] = start
+            if after is not None:
+                query['Date']['$gt'] = after
+            if end is not None:
+                query['Date']['$lt'] = end
+        projection = dict.fromkeys(columns, 1)
+        projection['_id'] = 0
+        cursor = self.collection.find(query, projection).sort('Date', 1)
+        return cursor_to_frame(cursor.batch_size(self.batch_size),
+                               columns, self.batch_size)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+class MongoSync:
+    """Appends new daily documents of a MongoSource to a dataset of the store.
+
+    The latest `Date` of the dataset is the high-water mark, every `sync`
+    only fetches documents newer than it (backed by an index on `Date`) and
+    computes the derived columns (see metrics.py) for the new rows only.
+
+    Parameters
+    --------
+    source: MongoSource
+    store: data_store.DataStore
+    name: str, dataset of the store to append to
+    """
+
+    def __init__(self, source, store, name='bali'):
+        self.source = source
+        self.store = store
+        self.name = name
+        self._indexed = False
+        self._stop = threading.Event()
+
+    def high_water_mark(self):
+        return self.store.latest(self.name)['Date'].max()
+
+    def sync(self):
+        """Fetches and appends new documents, returns the number of rows added."""
+        self._ensure_index()
+        high_water_mark = self.high_water_mark()
+        after = None if pd.isnull(high_water_mark) else high_water_mark.to_pydatetime()
+        new_rows = self.source.find_frame(
+            columns=self.store.columns[self.name], after=after)
+        if new_rows.empty:
+            return 0
+        new_rows['Date'] = pd.to_datetime(new_rows['Date'])
+
+        location = self.store.location_columns[self.name]
+        population, unit = metrics.POPULATION.get(self.name, (None, 1))
+
+        def rows(dataset):
+            # the file may have been reloaded with newer rows in the meantime
+            latest = dataset.latest['Date'].max()
+            rows = new_rows.dropna(subset=['Date'])
+            if not pd.isnull(latest):
+                rows = rows[rows['Date'] > latest]
+            # a day fetched twice is taken once
+            rows = rows.drop_duplicates([location, 'Date'], keep='last')
+            if rows.empty:
+                return None
+            return metrics.extend(dataset.tail(metrics.WINDOW), rows,
+                                  location, population, unit)
+        return self.store.append(self.name, rows)
+
+    def start(self, interval):
+        """Runs `sync` every `interval` seconds in a background thread."""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    count = self.sync()
+                except Exception:
+                    logger.exception('sync of %s failed', self.name)
+                else:
+                    if count:
+                        logger.info('synced %s new rows into %s', count, self.name)
+        thread = threading.Thread(target=run, name='mongo-sync', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def _ensure_index(self):
+        if self._indexed:
+            return
+        import pymongo
+        try:
+            self.source.collection.create_index([('Date', pymongo.ASCENDING)])
+        except pymongo.errors.OperationFailure:
+            # read-only user, the index has to be created by the admin
+            logger.warning('could not create index on Date')
+        self._indexed = True
+
+
+def cursor_to_frame(cursor, columns, batch_size=1000):
+    """Builds a DataFrame from a cursor, `batch_size` documents at a time."""
+    frames = []
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            frames.append(pd.DataFrame.from_records(batch, columns=columns))
+            batch = []
+    if batch or not frames:
+        frames.append(pd.DataFrame.from_records(batch, columns=columns))
+    return pd.concat(frames, ignore_index=True)
+
+
+mongo = MongoSource()
@@ -0,0 +1,710 @@
+# In-memory data store for the webapp
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from instrumentation import phase, registry
+
+logger = logging.getLogger(__name__)
+
+# get relative data folder
+PATH = pathlib.Path(__file__).parent
+# env variable DATA_PATH points the app at another data folder
+DATA_PATH = pathlib.Path(os.getenv("DATA_PATH", PATH.joinpath("data"))).resolve()
+
+# dataset name -> file in DATA_PATH without suffix. The snapshot listed in
+# the manifest is read, else the typed `.parquet` file, else the `.csv` export
+DATASETS = dict(
+    # bali regencies
+    bali='bali_regency_data',
+    # indo provinces (change to kawalcovid)
+    indo='indo_province_data',
+    # data comparison and indo !
+    world='world_data',
+)
+
+# dataset name -> columns used by the dashboard, only these are loaded.
+# Per-capita, 7-day, CFR and growth columns are computed on load, see
+# metrics.compute
+COLUMNS = dict(
+    bali=[
+        'Date', 'Name_EN', 'id',
+        'new_cases', 'total_cases', 'new_deaths', 'total_deaths',
+        'new_recovered', 'total_recovered', 'population_2015',
+    ],
+    indo=[
+        'Date', 'Province', 'Name_EN', 'id',
+        'new_cases', 'total_cases', 'new_deaths', 'total_deaths',
+        'new_recovered', 'total_recovered', 'Population',
+    ],
+    world=[
+        'Date', 'location',
+        'new_cases', 'total_cases', 'new_deaths', 'total_deaths', 'population',
+        'new_cases_per_million',
+        'new_vaccinations_smoothed_per_million',
+        'people_fully_vaccinated_per_hundred',
+        'median_age', 'aged_65_older', 'male_smokers', 'female_smokers',
+        'diabetes_prevalence',
+    ],
+)
+
+# dataset name -> column naming the location of a row
+LOCATION_COLUMNS = dict(
+    bali='Name_EN',
+    indo='Province',
+    world='location',
+)
+
+# list of the published snapshots of a data folder, see `publish`
+MANIFEST = 'manifest.json'
+# hex digits of the content hash in the snapshot file names
+HASH_LENGTH = 16
+
+# columns holding counts, stored as int32 (float32 if they have gaps),
+# other float columns are rates stored as float32 and text columns
+# (locations, names, ...) are stored as categoricals
+COUNT_COLUMNS = [
+    'id', 'No',
+    'new_cases', 'total_cases', 'new_deaths', 'total_deaths',
+    'new_recovered', 'total_recovered', 'new_treatment', 'total_treatment',
+    'Population',
+]
+
+
+class Dataset:
+    """One loaded dataset with the views derived from it.
+
+    Attributes
+    --------
+    source: (path, modification time) of the file the frame was read from
+    location_column: column naming the location of a row
+    key: column of the regions in `latest`, `id` or `location_column`
+    frame: DataFrame sorted by location and date, rows added by `append`
+        follow the last row of their location
+    index: dict, location -> slice of the rows of that location in `frame`
+    latest: DataFrame, one row per region (`id`, or location if the dataset
+        has no `id` column) holding its most recent day
+    """
+
+    def __init__(self, source, frame, location_column, index=None, latest=None):
+        self.source = source
+        self.location_column = location_column
+        if index is None:
+            frame = apply_schema(frame).sort_values(
+                [location_column, 'Date'], kind='mergesort',
+                na_position='first').reset_index(drop=True)
+        self.frame = frame
+        self.index = build_location_index(frame, location_column) if index is None else index
+        self.key = 'id' if 'id' in frame.columns else location_column
+        self.latest = latest_snapshot(frame, self.key) if latest is None else latest
+
+    def tail(self, count):
+        """Returns the last `count` rows of every location."""
+        positions = [np.arange(max(rows.start, rows.stop - count), rows.stop)
+                     for rows in self.index.values()]
+        return self.frame.iloc[np.concatenate(positions) if positions else []]
+
+    def append(self, rows):
+        """Returns a new Dataset with `rows` added.
+
+        Rows newer than the last day of their location are inserted after
+        it, the index and the latest snapshot are only updated for their
+        locations, nothing is sorted again. Other rows (older days, rows
+        that do not fit the dtypes) rebuild the whole dataset.
+        """
+        location = self.location_column
+        frame = self.frame
+        rows = rows.dropna(subset=['Date']).sort_values(
+            [location, 'Date'], kind='mergesort').reset_index(drop=True)
+        if rows.empty:
+            return self
+        try:
+            frame, rows = _conform(frame, apply_schema(rows))
+        except (TypeError, ValueError):
+            return self._rebuild(rows)
+
+        # rows of a location go after its last row, new locations at the end
+        locations = rows[location].to_numpy()
+        first = rows.groupby(location, sort=False, observed=True)['Date'].min()
+        stops = {}
+        for name, date in first.items():
+            current = self.index.get(name)
+            if current is None:
+                continue
+            last = frame['Date'].iat[current.stop - 1]
+            if not pd.isnull(last) and date <= last:
+                return self._rebuild(rows)
+            stops[name] = current.stop
+        size = len(frame)
+        # rows of new locations after those of the last location
+        known = np.array([name in stops for name in locations], dtype=bool)
+        rows = rows.iloc[np.argsort(~known, kind='stable')].reset_index(drop=True)
+        locations = rows[location].to_numpy()
+        positions = np.array([stops.get(name, size) for name in locations])
+        order = np.insert(np.arange(size), positions, np.arange(size, size + len(rows)))
+        merged = pd.concat([frame, rows], ignore_index=True).take(order)
+        merged = merged.reset_index(drop=True)
+
+        # old rows move by the number of new rows inserted before them
+        inserted = np.sort(positions)
+        counts = pd.Series(locations).value_counts(sort=False)
+        index = {}
+        for name, current in self.index.items():
+            start = current.start + np.searchsorted(inserted, current.start, 'right')
+            stop = current.stop + np.searchsorted(inserted, current.stop, 'left') \
+                + counts.get(name, 0)
+            index[name] = slice(int(start), int(stop))
+        new = np.flatnonzero(order >= size)
+        for name in counts.index:
+            if name not in index:
+                where = new[locations[order[new] - size] == name]
+                index[name] = slice(int(where[0]), int(where[-1]) + 1)
+
+        latest = latest_snapshot(rows, self.key)
+        _, previous = _conform(merged, self.latest)
+        latest = pd.concat([previous[~previous[self.key].isin(latest[self.key])], latest])
+        latest = latest.sort_values(self.key, kind='mergesort').reset_index(drop=True)
+        return Dataset(self.source, merged, location, index, latest)
+
+    def _rebuild(self, rows):
+        return Dataset(self.source, pd.concat([self.frame, rows], ignore_index=True),
+                       self.location_column)
+
+
+class DataStore:
+    """Loads every dataset once per worker and keeps it in memory.
+
+    Callbacks only read memory. `refresh` (run by the `watch` thread)
+    reloads datasets whose snapshot in the manifest or whose file changed,
+    and swaps all of them in at once, so a request never waits for disk
+    I/O nor sees a half-published refresh.
+
+    Every frame is sorted by location and date, so the rows of one location
+    are a contiguous slice which `location` returns without scanning the
+    whole frame.
+
+    Parameters
+    --------
+    data_path: path of the folder holding the dataset files
+    datasets: dict, dataset name -> file name inside `data_path`, without
+        suffix
+    location_columns: dict, dataset name -> column holding the location
+    columns: dict, dataset name -> columns to load, all if missing or None
+    """
+
+    def __init__(self, data_path=DATA_PATH, datasets=None,
+                 location_columns=None, columns=None):
+        self.data_path = pathlib.Path(data_path)
+        self.datasets = dict(DATASETS if datasets is None else datasets)
+        self.location_columns = dict(
+            LOCATION_COLUMNS if location_columns is None else location_columns)
+        self.columns = dict(COLUMNS if columns is None else columns)
+        # bumped when loaded datasets are replaced, lets derived caches
+        # detect stale entries
+        self.version = 0
+        # name -> Dataset, replaced as a whole, never changed in place
+        self._datasets = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def path(self, name, manifest=None):
+        """Returns the file of dataset `name`, see `dataset_path`."""
+        return dataset_path(self.data_path.joinpath(self.datasets[name]), manifest)
+
+    def get(self, name):
+        """Returns the DataFrame of dataset `name`, loading it if needed.
+
+        The returned frame is shared between all callbacks and must not be
+        modified in place.
+        """
+        return self.dataset(name).frame
+
+    def location(self, name, location):
+        """Returns the date-sorted rows of `location` in dataset `name`.
+
+        Unknown locations give an empty frame with the dataset's columns.
+        """
+        dataset = self.dataset(name)
+        return dataset.frame.iloc[dataset.index.get(location, slice(0, 0))]
+
+    def locations(self, name):
+        """Returns the locations of dataset `name`."""
+        return list(self.dataset(name).index)
+
+    def latest(self, name):
+        """Returns the latest row of every region in dataset `name`."""
+        return self.dataset(name).latest
+
+    def dataset(self, name):
+        """Returns the `Dataset` of `name`, loading it on first use."""
+        dataset = self._datasets.get(name)
+        if dataset is None:
+            with self._lock, phase('load'):
+                dataset = self._datasets.get(name)
+                if dataset is None:
+                    dataset = self._read(name)
+                    self._datasets = dict(self._datasets, **{name: dataset})
+        return dataset
+
+    def append(self, name, func):
+        """Appends the rows `func(dataset)` returns to dataset `name`.
+
+        Used for rows fetched from other sources (see data_source.py), the
+        cost depends on the number of new rows (see `Dataset.append`). The
+        changes are kept until the dataset's file is replaced.
+
+        Returns
+        --------
+        int, number of rows appended
+        """
+        dataset = self.dataset(name)
+        with self._lock:
+            dataset = self._datasets.get(name, dataset)
+            rows = func(dataset)
+            if rows is None or rows.empty:
+                return 0
+            self._datasets = dict(self._datasets, **{name: dataset.append(rows)})
+            self.version += 1
+        return len(rows)
+
+    def refresh(self):
+        """Reloads loaded datasets whose file changed, returns `version`.
+
+        The changed datasets are read first and then swapped in together
+        with one version bump. The manifest is read once, so all of them
+        come from the same publication.
+        """
+        changed = {}
+        manifest = read_manifest(self.data_path)
+        for name, dataset in list(self._datasets.items()):
+            path = self.path(name, manifest)
+            if _source(path) != dataset.source:
+                changed[name] = self._read(name, path)
+        if changed:
+            with self._lock:
+                self._datasets = dict(self._datasets, **changed)
+                self.version += 1
+            logger.info('reloaded %s, data version %s',
+                        ', '.join(sorted(changed)), self.version)
+        return self.version
+
+    def watch(self, interval):
+        """Runs `refresh` every `interval` seconds in a background thread."""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    # e.g. a file removed between the manifest and the read,
+                    # the next refresh picks up the newer snapshot
+                    logger.exception('refresh of the datasets failed')
+        thread = threading.Thread(target=run, name='data-watch', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def memory_usage(self):
+        """Returns the memory used by every loaded dataset in bytes."""
+        return {name: int(dataset.frame.memory_usage(deep=True).sum())
+                for name, dataset in self._datasets.items()}
+
+    def preload(self):
+        """Loads all datasets whose file exists."""
+        for name in self.datasets:
+            if self.path(name).exists():
+                self.dataset(name)
+
+    def _read(self, name, path=None):
+        path = self.path(name) if path is None else path
+        source = _source(path)
+        frame = read_dataset(path, self.columns.get(name))
+        population, unit = metrics.POPULATION.get(name, (None, 1))
+        frame = metrics.compute(frame, self.location_columns[name], population, unit)
+        return Dataset(source, frame, self.location_columns[name])
+
+
+def _source(path):
+    # identifies the content of a dataset file, snapshots are never modified
+    return str(path), os.stat(path).st_mtime_ns
+
+
+def read_dataset(path, columns=None):
+    """Reads a Parquet or CSV dataset, optionally only some columns.
+
+    A Parquet dataset is a file or a directory of part files (see
+    `append_dataset`). Requested columns missing in the file are skipped.
+    """
+    path = pathlib.Path(path)
+    if path.suffix == '.parquet':
+        if columns is not None:
+            names = set(_parquet_schema(path).names)
+            columns = [c for c in columns if c in names]
+        return pd.read_parquet(path, columns=columns)
+
+    # csv files written with `to_csv` start with the unnamed old index
+    def usecols(column):
+        if column.startswith('Unnamed: '):
+            return False
+        return columns is None or column in columns
+    return pd.read_csv(path, usecols=usecols, parse_dates=['Date'])
+
+
+def apply_schema(frame):
+    """Returns `frame` with the compact dtypes of the data store.
+
+    Text columns become categoricals, counts int32 and rates float32, dates
+    are parsed as datetime64. Values that do not fit (e.g. world population
+    in int32) keep 64 bit.
+    """
+    columns = {}
+    for column, values in frame.items():
+        if column == 'Date':
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                columns[column] = pd.to_datetime(values, errors='coerce')
+        elif pd.api.types.is_object_dtype(values) or \
+                pd.api.types.is_string_dtype(values):
+            columns[column] = values.astype('category')
+        elif column in COUNT_COLUMNS:
+            columns[column] = _downcast_count(values)
+        elif pd.api.types.is_float_dtype(values) and values.dtype != np.float32:
+            columns[column] = values.astype(np.float32)
+    if not columns:
+        return frame
+    frame = frame.copy(deep=False)
+    for column, values in columns.items():
+        frame[column] = values
+    return frame
+
+
+def _downcast_count(values):
+    if values.isna().any():
+        # float32 is exact for whole numbers up to 2**24
+        if values.abs().max() < 2 ** 24:
+            return values.astype(np.float32)
+        return values.astype(np.float64)
+    if values.abs().max() < 2 ** 31:
+        return values.astype(np.int32)
+    return values.astype(np.int64)
+
+
+def write_dataset(frame, path, csv=False, staging=None):
+    """Publishes `frame` as the dataset `path`, and to '.csv' if `csv` is set.
+
+    The Parquet file becomes a snapshot of the dataset, see `publish`.
+    Files are written to a temporary name first and then renamed, so a
+    running app never reads a half-written file.
+
+    Parameters
+    --------
+    staging: folder to write the files to instead, they are only published
+        by calling `publish`
+
+    Returns
+    --------
+    list of (written file, target) of the files, for `publish`
+    """
+    path = pathlib.Path(path)
+    parquet = path.with_suffix('.parquet')
+    moves = [(_staged(parquet, staging), parquet)]
+    frame.to_parquet(moves[0][0], index=False)
+    if csv:
+        csv_path = path.with_suffix('.csv')
+        moves.append((_staged(csv_path, staging), csv_path))
+        frame.to_csv(moves[-1][0])
+    if staging is None:
+        publish(moves)
+    return moves
+
+
+def append_dataset(frame, path, csv=False, staging=None):
+    """Publishes the dataset `path` with the rows of `frame` appended.
+
+    The new snapshot is a directory of Parquet parts: the parts of the
+    current one are linked into it, not copied, and the rows are written
+    as a new part named by its content hash, so the cost depends on the
+    number of new rows only (the snapshot is named without reading the
+    other parts, see `content_hash`). The rows are cast to the schema of
+    the existing parts. With `csv` they are also appended to a copy of the
+    '.csv' export, which costs its size.
+
+    Parameters
+    --------
+    staging: see `write_dataset`
+
+    Returns
+    --------
+    list of (written file, target) of the files, for `publish`
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    path = pathlib.Path(path)
+    parquet = path.with_suffix('.parquet')
+    current = dataset_path(path)
+    folder = staging
+    if staging is None:
+        folder = tempfile.mkdtemp(prefix='.append-', dir=str(path.parent))
+    directory = pathlib.Path(folder).joinpath(parquet.name)
+    directory.mkdir()
+
+    schema = None
+    if current.suffix == '.csv' and current.exists():
+        # the first append of a dataset only exported as CSV
+        part = pathlib.Path(folder).joinpath(parquet.stem + '.part')
+        read_dataset(current).to_parquet(part, index=False)
+        _add_part(part, directory, 0)
+    elif current.is_dir():
+        for part in current.glob('part-*.parquet'):
+            _link(part, directory.joinpath(part.name))
+    elif current.exists():
+        # a dataset written as one file, hashed once
+        part = pathlib.Path(folder).joinpath(parquet.stem + '.part')
+        _link(current, part)
+        _add_part(part, directory, 0)
+    if any(directory.iterdir()):
+        schema = _parquet_schema(directory)
+        frame = frame.reindex(columns=schema.names)
+    table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+    part = pathlib.Path(folder).joinpath(parquet.stem + '.part')
+    pq.write_table(table, part)
+    _add_part(part, directory, int(time.time() * 1e6))
+    moves = [(directory, parquet)]
+
+    csv_path = path.with_suffix('.csv')
+    if csv:
+        # the export is appended to a copy
+        moves.append((_staged(csv_path, folder), csv_path))
+        if csv_path.exists():
+            shutil.copyfile(csv_path, moves[-1][0])
+            # the first column is the unnamed index written by `to_csv`
+            header = pd.read_csv(csv_path, nrows=0).columns[1:]
+            frame.reindex(columns=header).to_csv(
+                moves[-1][0], mode='a', header=False)
+        else:
+            frame.to_csv(moves[-1][0])
+    if staging is None:
+        publish(moves)
+        shutil.rmtree(folder)
+    return moves
+
+
+def publish(moves):
+    """Renames written files into place, see `write_dataset`.
+
+    Parquet datasets become immutable snapshots named by their content hash,
+    <name>.<hash>.parquet, listed in the `MANIFEST` of their folder. The
+    manifest is replaced in one rename, so readers switch to all datasets
+    of `moves` at once. Other files (CSV exports, ...) are renamed into
+    place after it.
+
+    Snapshots of the replaced manifest are kept for readers still loading
+    them, older ones are removed.
+
+    Parameters
+    --------
+    moves: list of (written file, target)
+    """
+    snapshots = {}  # folder -> {dataset file name: snapshot file name}
+    files = []
+    for source, target in moves:
+        source, target = pathlib.Path(source), pathlib.Path(target)
+        if target.suffix != '.parquet':
+            files.append((source, target))
+            continue
+        snapshot = target.with_name('{}.{}.parquet'.format(
+            target.stem, content_hash(source)[:HASH_LENGTH]))
+        if snapshot.exists():
+            # same content as a published snapshot
+            _remove(source)
+        else:
+            os.replace(source, snapshot)
+        snapshots.setdefault(target.parent, {})[target.stem] = snapshot.name
+
+    for folder, datasets in snapshots.items():
+        manifest = read_manifest(folder)
+        current = manifest['datasets']
+        if all(current.get(name) == file for name, file in datasets.items()):
+            continue
+        published = dict(current, **datasets)
+        _write_json(folder.joinpath(MANIFEST), dict(
+            version=hashlib.sha256(json.dumps(
+                published, sort_keys=True).encode()).hexdigest()[:HASH_LENGTH],
+            created=dt.datetime.now().isoformat(timespec='seconds'),
+            datasets=published, previous=current))
+        for name in datasets:
+            keep = {published[name], current.get(name)}
+            for snapshot in folder.glob(name + '.*.parquet'):
+                if snapshot.name not in keep:
+                    _remove(snapshot)
+    for source, target in files:
+        os.replace(source, target)
+
+
+def read_manifest(folder):
+    """Returns the manifest of a data folder, empty if there is none.
+
+    Returns
+    --------
+    dict with `version` (hash of the published snapshots), `created`,
+    `datasets` (dataset file name -> snapshot file name) and `previous`
+    (the datasets of the manifest it replaced)
+    """
+    path = pathlib.Path(folder).joinpath(MANIFEST)
+    if not path.exists():
+        return dict(version=None, created=None, datasets={}, previous={})
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def dataset_path(path, manifest=None):
+    """Returns the file of the dataset `path` (without suffix).
+
+    That is its snapshot in the manifest of the folder, else the Parquet
+    file if it exists, else the CSV export.
+
+    Parameters
+    --------
+    manifest: dict, the manifest of the folder (see `read_manifest`), read
+        if None
+    """
+    path = pathlib.Path(path)
+    if manifest is None:
+        manifest = read_manifest(path.parent)
+    snapshot = manifest['datasets'].get(path.name)
+    if snapshot is not None:
+        return path.with_name(snapshot)
+    parquet = path.with_suffix('.parquet')
+    return parquet if parquet.exists() else path.with_suffix('.csv')
+
+
+def content_hash(path):
+    """Returns the SHA-256 of a file, or of a directory snapshot, in hex.
+
+    The parts of a directory are never modified once published and are
+    named by their own content hash (see `append_dataset`), so a directory
+    is hashed from the names and sizes of its files, without reading them.
+    """
+    path = pathlib.Path(path)
+    digest = hashlib.sha256()
+    if path.is_dir():
+        for file in sorted(p for p in path.rglob('*') if p.is_file()):
+            digest.update('{} {}\n'.format(
+                file.relative_to(path).as_posix(), file.stat().st_size).encode())
+        return digest.hexdigest()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _staged(target, staging):
+    # file to write `target` to before it is renamed into place
+    if staging is None:
+        return target.with_name(target.name + '.tmp')
+    return pathlib.Path(staging).joinpath(target.name)
+
+
+def _add_part(part, directory, number):
+    # parts are read in the order of their names: part-<number>-<hash>
+    os.replace(part, directory.joinpath('part-{}-{}.parquet'.format(
+        number, content_hash(part)[:HASH_LENGTH])))
+
+
+def _parquet_schema(path):
+    # schema of a Parquet file or of the parts of a directory
+    import pyarrow.dataset as ds
+    return ds.dataset(path, format='parquet').schema
+
+
+def _link(source, target):
+    # parts of snapshots are never modified, they can be shared
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _remove(path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _write_json(path, data):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _conform(frame, rows):
+    # `rows` with the columns and dtypes of `frame`, categories of both are
+    # extended by the values of the other, so they can be concatenated
+    frame = frame.copy(deep=False)
+    rows = rows.reindex(columns=frame.columns)
+    for column, values in frame.items():
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            added = pd.Index(rows[column].dropna().unique()).difference(
+                values.cat.categories)
+            if len(added):
+                frame[column] = values = values.cat.add_categories(added)
+            rows[column] = pd.Categorical(rows[column], categories=values.cat.categories)
+        elif rows[column].dtype != values.dtype:
+            rows[column] = rows[column].astype(values.dtype)
+    return frame, rows
+
+
+def build_location_index(frame, column):
+    """Maps every location of a frame sorted by `column` to its row slice."""
+    index = {}
+    groups = frame.groupby(column, sort=False, observed=True)
+    for location, positions in groups.indices.items():
+        index[location] = slice(positions[0], positions[-1] + 1)
+    return index
+
+
+def latest_snapshot(frame, key):
+    """Returns the row with the most recent `Date` for every value of `key`."""
+    dated = frame.dropna(subset=['Date'])
+    rows = dated.groupby(key, sort=True, observed=True)['Date'].idxmax()
+    return dated.loc[rows.to_numpy()].reset_index(drop=True)
+
+
+store = DataStore()
+registry.gauge('data_store_version', 'Version of the datasets loaded by this worker.',
+               lambda: store.version)
+
+
+# Main
+# python data_store.py convert: convert the csv exports to Parquet
+# python data_store.py memory: report the memory footprint per dataset
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'convert'
+    if command == 'convert':
+        for file_name in DATASETS.values():
+            csv_path = DATA_PATH.joinpath(file_name).with_suffix('.csv')
+            if csv_path.exists():
+                write_dataset(read_dataset(csv_path), csv_path)
+                print('converted', csv_path.name)
+    elif command == 'memory':
+        store.preload()
+        for name, size in store.memory_usage().items():
+            raw = read_dataset(store.path(name))
+            print('{}: {:.2f} MB in store, {:.2f} MB with all columns '
+                  'and default dtypes, {} rows'.format(
+                      name, size / 2 ** 20,
+                      raw.memory_usage(deep=True).sum() / 2 ** 20, len(raw)))
@@ -0,0 +1,136 @@
+# Downsampling of the daily time series shipped to the graphs of the webapp
+#
+# A trace gets at most MAX_POINTS points for its whole history, plus at most
+# MAX_POINTS for the visible window: daily values if the window is short
+# enough, else the daily mean of whole weeks (the same for the days outside
+# the window). The payload is bounded whatever the length of the history.
+import os
+
+import pandas as pd
+
+MAX_POINTS = int(os.getenv('GRAPH_MAX_POINTS', 200))
+DAY = pd.Timedelta(days=1)
+# a Monday, weekly buckets start on Mondays
+ORIGIN = pd.Timestamp('2020-01-06')
+
+
+def bucket_days(days, max_points=MAX_POINTS):
+    """Returns the days per point to show `days` days in at most `max_points` points.
+
+    That is 1 or a number of whole weeks.
+    """
+    if days <= max_points:
+        return 1
+    return 7 * -(-days // (7 * max_points))
+
+
+def resample(dates, values, days):
+    """Means of `values` over buckets of `days` days.
+
+    Returns
+    --------
+    DataFrame with `start` and `end` (first and last date of the bucket
+    with data) and `value`, one row per bucket sorted by date
+    """
+    frame = pd.DataFrame({'Date': pd.to_datetime(dates).to_numpy(),
+                          'value': pd.Series(values).to_numpy()})
+    frame = frame.dropna(subset=['Date'])
+    if days == 1:
+        return pd.DataFrame(dict(start=frame['Date'], end=frame['Date'],
+                                 value=frame['value'])).reset_index(drop=True)
+    bucket = ((frame['Date'] - ORIGIN) // (days * DAY)).to_numpy()
+    groups = frame.groupby(bucket, sort=True)
+    return pd.DataFrame(dict(
+        start=groups['Date'].min(), end=groups['Date'].max(),
+        value=groups['value'].mean())).reset_index(drop=True)
+
+
+def points(dates, values, window=None, max_points=MAX_POINTS):
+    """Downsamples a daily series, with a finer resolution inside `window`.
+
+    A window shorter than `max_points` days is widened to `max_points`
+    days, so panning a little does not show coarse data.
+
+    Parameters
+    --------
+    dates, values: Series of the daily series
+    window: (start, end) Timestamps of the visible range, None if the whole
+        range is visible
+
+    Returns
+    --------
+    DataFrame, see `resample`
+    """
+    dates = pd.Series(pd.to_datetime(dates).to_numpy())
+    values = pd.Series(values).reset_index(drop=True)
+    if dates.isna().all():
+        return resample(dates, values, 1)
+    coarse = bucket_days((dates.max() - dates.min()) // DAY + 1, max_points)
+    if window is None:
+        return resample(dates, values, coarse)
+
+    start, end = window
+    pad = max(0, max_points - ((end - start) // DAY + 1)) // 2
+    start, end = start - pad * DAY, end + pad * DAY
+    fine = bucket_days((end - start) // DAY + 1, max_points)
+    parts = [(dates < start, coarse),
+             ((dates >= start) & (dates <= end), fine),
+             (dates > end, coarse)]
+    return pd.concat([resample(dates[rows], values[rows], days)
+                      for rows, days in parts], ignore_index=True)
+
+
+def bar_positions(points, slot=0, slots=1, gap=0.15):
+    """Returns x, width and offset of the bars of `points` (see `points`) on a date axis.
+
+    Every bar is centred on the days of its point, `slots` bars (the traces
+    of a grouped bar chart) share them, the bar of this trace is in `slot`.
+    Widths and offsets are in milliseconds, the unit of date axes, lists
+    or a single number for all bars.
+    """
+    days = points['end'] - points['start'] + DAY
+    x = points['start'] - DAY / 2 + days / 2
+    group = days.dt.total_seconds() * 1000 * (1 - gap)
+    width = (group / slots).round().astype('int64')
+    offset = (-group / 2 + slot * width).round().astype('int64')
+    # one number if all bars are alike, e.g. all daily
+    if width.nunique() <= 1:
+        return x, int(width.iloc[0]) if len(width) else None, \
+            int(offset.iloc[0]) if len(offset) else None
+    return x, width.tolist(), offset.tolist()
+
+
+def relayout_window(relayout, axis='xaxis', days=7):
+    """Returns the visible x range of a graph from its `relayoutData`.
+
+    The range is widened to whole buckets of `days` days (weeks starting on
+    Mondays by default), so close zooms give the same window and share a
+    figure in the cache.
+
+    Returns
+    --------
+    ('YYYY-MM-DD', 'YYYY-MM-DD') of the first and last day, ('', '') if the
+    whole range is shown, None if `relayout` does not change the range or is
+    not valid
+    """
+    if not isinstance(relayout, dict):
+        return None
+    if relayout.get(axis + '.autorange'):
+        return '', ''
+    # sent by the browser, anything may come
+    try:
+        if axis + '.range' in relayout:
+            start, end = relayout[axis + '.range'][:2]
+        elif axis + '.range[0]' in relayout and axis + '.range[1]' in relayout:
+            start, end = relayout[axis + '.range[0]'], relayout[axis + '.range[1]']
+        else:
+            return None
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        if start is pd.NaT or end is pd.NaT or start > end:
+            return None
+        bucket = days * DAY
+        start = ORIGIN + (start - ORIGIN) // bucket * bucket
+        end = ORIGIN + -(-(end.ceil('D') - ORIGIN + DAY) // bucket) * bucket - DAY
+        return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+    except (TypeError, ValueError, OverflowError):
+        return None
@@ -0,0 +1,446 @@
+# Daily update of the datasets, replaces the processing notebook
+#
+#   python etl.py bali|indo|world [SOURCE] [--data DIR] [--csv] [--full]
+#   python etl.py all [--source NAME=SOURCE ...] [--processes N] [--data DIR] [--csv]
+#
+# bali: SOURCE is the JSON-lines file of the Scrapy spider (daily.jl), one
+#   line per scraped table of https://infocorona.baliprov.go.id/API/pendataan/,
+#   laporan-harian-01 and -02 alternating. The file is streamed from where the
+#   last run stopped (kept in <dataset>.etl.json next to the dataset), only
+#   days newer than the dataset are processed and appended to it.
+# indo: SOURCE is the Kaggle time series of the provinces
+#   (https://www.kaggle.com/hendratno/covid19-indonesia), rebuilt on every run.
+# world: SOURCE is the OWID data (file or URL), rebuilt on every run, the
+#   derived columns are computed for parts of the countries in parallel.
+# all: runs the pipelines in parallel processes, the outputs are written to a
+#   staging folder and published together once all of them succeeded.
+# Datasets are published as snapshots listed in data/manifest.json, see
+# data_store.publish.
+# Default sources are in SOURCES, relative to the data folder.
+import abc
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import pathlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import metrics
+from regions import RegionRegistry
+from data_store import (COLUMNS, DATA_PATH, DATASETS, append_dataset, dataset_path,
+                        publish, read_dataset, write_dataset)
+
+logger = logging.getLogger(__name__)
+
+# columns of laporan-harian-02, the even lines
+FIRST_TABLE_COLUMNS = [
+    'No', 'Kabupaten / County', 'new_treatment', 'total_treatment',
+    'new_recovered', 'total_recovered', 'new_deaths', 'total_deaths',
+    'new_cases', 'total_cases', 'Date']
+# columns of laporan-harian-01, the odd lines
+SECOND_TABLE_COLUMNS = [
+    'No', 'Kabupaten / County', 'new PPLN/PMI',
+    'total history-of-foreign-travel/ migrant-worker (PPLN/PMI)',
+    'new domestic-travel-history', 'total domestic-travel-history (PPDN)',
+    'new_local_transmission', 'total_local_transmission',
+    'new_other_transmission', 'total_other_transmission', 'new_cases',
+    'total_cases', 'Date']
+# rows of every table, the regencies and other regencies
+TABLE_ROWS = 10
+NUMERIC_COLUMNS = [
+    'new_treatment', 'total_treatment', 'new_recovered', 'total_recovered',
+    'new_deaths', 'total_deaths', 'new_cases', 'total_cases', 'new PPLN/PMI',
+    'total history-of-foreign-travel/ migrant-worker (PPLN/PMI)',
+    'new domestic-travel-history', 'total domestic-travel-history (PPDN)',
+    'new_local_transmission', 'total_local_transmission',
+    'new_other_transmission', 'total_other_transmission']
+# days of the dataset read as history of new days, see BaliPipeline.history
+HISTORY_DAYS = 4 * metrics.WINDOW
+# columns of the Kaggle Indonesia data -> dataset columns
+INDO_COLUMNS = {
+    'New Cases': 'new_cases', 'New Deaths': 'new_deaths',
+    'New Recovered': 'new_recovered', 'Total Cases': 'total_cases',
+    'Total Deaths': 'total_deaths', 'Total Recovered': 'total_recovered',
+}
+# columns of the OWID data kept in the world dataset
+WORLD_COLUMNS = ['iso_code', 'continent', 'date'] + COLUMNS['world'][1:]
+# dataset name -> default source, relative to the data folder
+SOURCES = dict(
+    bali='daily.jl',
+    indo='covid_19_indonesia_time_series_all.csv',
+    world='https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/owid-covid-data.csv',
+)
+# folder of the outputs of `run_all` until they are published
+STAGING = '.staging'
+
+
+def read_records(path, offset=0, count=0):
+    """Yields the records of a JSON-lines file, starting at byte `offset`.
+
+    Broken lines are skipped (like `json_lines.reader(f, broken=True)`), an
+    unterminated last line is left for the next run as the spider may still
+    be writing it.
+
+    Parameters
+    --------
+    path: JSON-lines file
+    offset: int, byte position to start at, the end of a line
+    count: int, number of records before `offset`
+
+    Yields
+    --------
+    (number, offset, record), number counts the records from 1, offset is
+    the byte position after the record
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning('skipped broken line at byte %s', offset - len(line))
+                continue
+            count += 1
+            yield count, offset, record
+
+
+def parse_tables(records):
+    """Splits records into the rows of the two tables.
+
+    Returns
+    --------
+    first, second: DataFrames with `FIRST_TABLE_COLUMNS` and
+        `SECOND_TABLE_COLUMNS`
+    """
+    tables = ([], [])
+    for number, record in records:
+        rows = tables[0] if number % 2 == 0 else tables[1]
+        for row in record['data'][:TABLE_ROWS]:
+            rows.append(list(row.values()) if isinstance(row, dict) else list(row))
+    return (pd.DataFrame(tables[0], columns=FIRST_TABLE_COLUMNS),
+            pd.DataFrame(tables[1], columns=SECOND_TABLE_COLUMNS))
+
+
+def clean(first, second, registry):
+    """Merges the two tables with the reference data of the regencies.
+
+    Parameters
+    --------
+    first, second: DataFrames of `parse_tables`
+    registry: regions.RegionRegistry, names, map ids and reference data
+    """
+    second = second.drop(['Kabupaten / County', 'new_cases', 'total_cases'], axis=1)
+    # a day scraped twice is taken from the last scrape
+    first = first.drop_duplicates(['No', 'Date'], keep='last')
+    second = second.drop_duplicates(['No', 'Date'], keep='last')
+    df = first.merge(second, how='left', on=['No', 'Date'])
+    # other regencies have no transmission numbers
+    df = df.fillna(0)
+    df['No'] = df['No'].astype(int)
+    df['Name_EN'] = registry.normalise(df['Kabupaten / County'], 'regency')
+    df['Date'] = pd.to_datetime(df['Date'].astype(str).str.strip(), errors='coerce')
+    df[NUMERIC_COLUMNS] = df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    # other regencies and foreigners have id 0
+    return registry.join(df, 'Name_EN', 'regency')
+
+
+class Pipeline(abc.ABC):
+    """Builds one dataset from its source.
+
+    Parameters
+    --------
+    source: input file (or URL if the pipeline reads it with pandas)
+    data_path: folder of the dataset, see data_store.py
+    registry: regions.RegionRegistry, defaults to the registry of `data_path`
+    """
+
+    name = None
+    # column naming the location of a row
+    location = None
+    # level of the regions in the registry, None if the registry is not used
+    level = None
+
+    def __init__(self, source, data_path=DATA_PATH, registry=None):
+        self.source = source if '://' in str(source) else pathlib.Path(source)
+        self.data_path = pathlib.Path(data_path)
+        self.path = self.data_path.joinpath(DATASETS[self.name])
+        self._registry = registry
+
+    @abc.abstractmethod
+    def run(self, csv=False, full=False, staging=None, executor=None):
+        """Updates the dataset, returns the written files.
+
+        Parameters
+        --------
+        csv: bool, also update the CSV export
+        full: bool, rebuild the dataset from the whole source
+        staging: folder to write the files to, they are published by
+            `data_store.publish` later, published right away if None
+        executor: concurrent.futures.Executor for parts of the work
+
+        Returns
+        --------
+        list of (written file, target), see `data_store.publish`
+        """
+
+    @property
+    def registry(self):
+        if self._registry is None:
+            self._registry = RegionRegistry.load(self.data_path)
+        return self._registry
+
+    def derive(self, rows, history=None):
+        """Computes the derived columns of `rows` (see metrics.py)."""
+        population, unit = metrics.POPULATION[self.name]
+        if history is None:
+            return metrics.compute(rows, self.location, population, unit)
+        frame = metrics.append(history, rows, self.location, population, unit)
+        return frame.iloc[len(history):]
+
+
+class BaliPipeline(Pipeline):
+    """Incremental update of the Bali regency dataset from the spider output.
+
+    The position in the source is checkpointed after every complete pair
+    of tables, together with the number of records before it, which
+    decides the table of the following lines.
+    """
+
+    name = 'bali'
+    location = 'Name_EN'
+    level = 'regency'
+
+    def __init__(self, source, data_path=DATA_PATH, registry=None):
+        super().__init__(source, data_path, registry)
+        self.state_path = self.path.with_suffix('.etl.json')
+
+    def run(self, csv=False, full=False, staging=None, executor=None):
+        """Processes the new records of the source, see `Pipeline.run`.
+
+        The checkpoint is written with the dataset, so it is only moved on
+        when the new rows are published.
+        """
+        last_date = None if full else self.last_date()
+        # without a dataset the checkpoint is stale, the whole source is read
+        state = {} if last_date is None else self.load_state()
+        if state.get('source') != str(self.source) or \
+                state.get('offset', 0) > os.path.getsize(self.source):
+            # another or a rewritten file, read it from the start
+            state = {}
+
+        records = []
+        checkpoint = state
+        for number, offset, record in read_records(
+                self.source, state.get('offset', 0), state.get('count', 0)):
+            records.append((number, record))
+            if number % 2 == 0:
+                checkpoint = dict(source=str(self.source), offset=offset, count=number)
+        # records after the last complete pair are read again next time
+        records = [r for r in records if r[0] <= checkpoint.get('count', 0)]
+
+        rows = self.transform(records, last_date)
+        moves = []
+        if len(rows):
+            if full or last_date is None:
+                moves = write_dataset(self.derive(rows), self.path, csv, staging)
+            else:
+                moves = append_dataset(self.derive(rows, self.history(last_date)),
+                                       self.path, csv, staging)
+        moves.append(self.save_state(checkpoint, staging))
+        logger.info('%s: %s records read, %s rows added', self.name,
+                    len(records), len(rows))
+        return moves
+
+    def transform(self, records, last_date=None):
+        """Builds the dataset rows of `records`, only days after `last_date`."""
+        if not records:
+            return pd.DataFrame()
+        first, second = parse_tables(records)
+        rows = clean(first, second, self.registry)
+        if last_date is not None:
+            rows = rows[rows['Date'] > last_date]
+        return rows.reset_index(drop=True)
+
+    def history(self, last_date):
+        """Returns the rows of the dataset the rolling values of new days need."""
+        # days of a regency may be missing, metrics.append takes the last
+        # WINDOW rows of every location from more days
+        since = last_date - dt.timedelta(days=HISTORY_DAYS)
+        path = dataset_path(self.path)
+        if path.suffix == '.parquet':
+            return pd.read_parquet(path, filters=[('Date', '>', pd.Timestamp(since))])
+        frame = read_dataset(path)
+        # new rows are numbered after the history by metrics.append
+        return frame[frame['Date'] > since].reset_index(drop=True)
+
+    def last_date(self):
+        """Returns the latest date of the dataset, None if there is none."""
+        path = dataset_path(self.path)
+        if not path.exists():
+            return None
+        latest = read_dataset(path, ['Date'])['Date'].max()
+        return None if pd.isnull(latest) else latest
+
+    def load_state(self):
+        if not self.state_path.exists():
+            return {}
+        with open(self.state_path, 'r') as f:
+            return json.load(f)
+
+    def save_state(self, state, staging=None):
+        tmp = (self.state_path.with_name(self.state_path.name + '.tmp')
+               if staging is None else staging.joinpath(self.state_path.name))
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        if staging is None:
+            os.replace(tmp, self.state_path)
+        return tmp, self.state_path
+
+
+class IndoPipeline(Pipeline):
+    """Indonesian provinces from the Kaggle time series.
+
+    The source holds the whole history, so the dataset is rebuilt on every
+    run. The country totals are kept as location 'Indonesia', with id 0.
+    """
+
+    name = 'indo'
+    location = 'Province'
+    level = 'province'
+
+    def run(self, csv=False, full=False, staging=None, executor=None):
+        rows = self.transform(pd.read_csv(self.source, encoding='utf-8-sig'))
+        logger.info('%s: %s rows', self.name, len(rows))
+        return write_dataset(self.derive(rows), self.path, csv, staging)
+
+    def transform(self, frame):
+        """Renames the columns and provinces of the source to the dataset's."""
+        frame = frame.rename(columns=INDO_COLUMNS)
+        frame['Date'] = pd.to_datetime(frame['Date'], format='%m/%d/%Y')
+        # the country rows have no province
+        frame['Province'] = self.registry.normalise(frame['Location'], 'province')
+        frame['Name_EN'] = frame['Province']
+        return self.registry.join(frame, 'Province', 'province', columns=['id'])
+
+
+class WorldPipeline(Pipeline):
+    """Countries and continents from the OWID data, rebuilt on every run.
+
+    Only `WORLD_COLUMNS` are read. With an executor the derived columns are
+    computed for `partitions` parts of whole locations in parallel.
+    """
+
+    name = 'world'
+    location = 'location'
+    partitions = os.cpu_count() or 1
+
+    def run(self, csv=False, full=False, staging=None, executor=None):
+        frame = pd.read_csv(self.source, usecols=lambda c: c in WORLD_COLUMNS,
+                            parse_dates=['date'])
+        frame = frame.rename(columns={'date': 'Date'})
+        if executor is None:
+            derived = self.derive(frame)
+        else:
+            parts = partition(frame, self.location, self.partitions)
+            derived = pd.concat(executor.map(self.derive, parts)).sort_index()
+        logger.info('%s: %s rows', self.name, len(derived))
+        return write_dataset(derived, self.path, csv, staging)
+
+
+def partition(frame, column, count):
+    """Splits `frame` into at most `count` parts of whole locations.
+
+    Locations are assigned in order of their name to parts of about the
+    same number of rows.
+    """
+    sizes = frame.groupby(column, sort=True, observed=True).size()
+    parts = (sizes.cumsum() - sizes) * count // max(len(frame), 1)
+    labels = frame[column].map(parts).fillna(0)
+    return [part for _, part in frame.groupby(labels.to_numpy(), sort=True)]
+
+
+def run_all(sources, data_path=DATA_PATH, csv=False, full=False, processes=None):
+    """Runs the pipelines of `sources` in parallel and publishes their outputs together.
+
+    Every pipeline runs in a process of the pool, the world pipeline in
+    this process, sending its parts to the pool. The outputs are written to
+    the `STAGING` folder and only published when all pipelines succeeded,
+    in one manifest, so the app never reads datasets from different runs.
+
+    Parameters
+    --------
+    sources: dict, dataset name -> source of its pipeline
+    processes: int, size of the pool, the number of CPUs if None
+
+    Returns
+    --------
+    list of (staged file, target) of the published files
+    """
+    data_path = pathlib.Path(data_path)
+    staging = data_path.joinpath(STAGING)
+    shutil.rmtree(staging, ignore_errors=True)
+    # loaded once, the pipelines would build its cache concurrently
+    registry = None
+    if any(PIPELINES[name].level for name in sources):
+        registry = RegionRegistry.load(data_path)
+    pipelines = [PIPELINES[name](source, data_path, registry)
+                 for name, source in sources.items()]
+
+    folders = {}
+    for pipeline in pipelines:
+        folders[pipeline.name] = staging.joinpath(pipeline.name)
+        folders[pipeline.name].mkdir(parents=True)
+
+    with ProcessPoolExecutor(processes) as executor:
+        # the other pipelines are queued before the parts of the world data
+        futures = [executor.submit(pipeline.run, csv, full, folders[pipeline.name])
+                   for pipeline in pipelines if not isinstance(pipeline, WorldPipeline)]
+        moves = []
+        for pipeline in pipelines:
+            if isinstance(pipeline, WorldPipeline):
+                moves += pipeline.run(csv, full, folders[pipeline.name], executor)
+        for future in futures:
+            moves += future.result()
+    publish(moves)
+    shutil.rmtree(staging)
+    return moves
+
+
+PIPELINES = dict(
+    bali=BaliPipeline,
+    indo=IndoPipeline,
+    world=WorldPipeline,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Updates the datasets of the app.')
+    parser.add_argument('dataset', choices=sorted(PIPELINES) + ['all'])
+    parser.add_argument('source', nargs='?', help='input file, default: see SOURCES')
+    parser.add_argument('--source', dest='sources', action='append', default=[],
+                        metavar='NAME=SOURCE', help='input of a dataset with `all`')
+    parser.add_argument('--data', default=str(DATA_PATH), help='folder of the datasets')
+    parser.add_argument('--csv', action='store_true', help='also update the CSV export')
+    parser.add_argument('--full', action='store_true',
+                        help='rebuild the dataset from the whole source')
+    parser.add_argument('--processes', type=int, help='processes of `all`, default: CPUs')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    sources = {name: pathlib.Path(args.data).joinpath(source)
+               if '://' not in source else source for name, source in SOURCES.items()}
+    sources.update(source.split('=', 1) for source in args.sources)
+    if args.dataset == 'all':
+        run_all(sources, args.data, csv=args.csv, full=args.full,
+                processes=args.processes)
+    else:
+        pipeline = PIPELINES[args.dataset](
+            args.source or sources[args.dataset], args.data)
+        pipeline.run(csv=args.csv, full=args.full)
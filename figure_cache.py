@@ -0,0 +1,149 @@
+# Cache of rendered figures for the webapp callbacks
+import functools
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+from data_store import store
+from instrumentation import phase, cache_result, registry
+import profiling
+
+
+class FigureCache:
+    """LRU cache of serialised figures keyed by callback inputs.
+
+    Figures (or any other callback output) are stored as JSON, a hit returns
+    a fresh object decoded from it, so no pandas or Plotly work is done for
+    repeated views. All entries are dropped when the version of the data
+    changes, functions in `listeners` are then called with the new version.
+
+    Parameters
+    --------
+    maxsize: int, number of figures kept
+    version: callable returning the current data version
+    """
+
+    def __init__(self, maxsize=512, version=None):
+        self.maxsize = maxsize
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.listeners = []
+        self._data_version = None
+        self._entries = OrderedDict()  # key -> figure JSON
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the figure dict of `key`, or None if not cached."""
+        self._check_version()
+        with self._lock:
+            figure_json = self._entries.get(key)
+            if figure_json is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        with phase('serialise'):
+            return json.loads(figure_json)
+
+    def put(self, key, figure, data_version=None):
+        """Stores a figure (plotly Figure or dict), returns it as a dict.
+
+        A figure rendered from data older than the current version (given
+        as `data_version`) is returned but not stored.
+        """
+        with phase('serialise'):
+            figure_json = to_json(figure)
+            self.put_json(key, figure_json, data_version)
+            return json.loads(figure_json)
+
+    def put_json(self, key, figure_json, data_version=None):
+        """Stores an already serialised figure."""
+        with self._lock:
+            if data_version is not None and data_version != self._data_version:
+                return
+            self._entries[key] = figure_json
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def data_version(self):
+        """Checks for new data and returns the version the entries belong to."""
+        self._check_version()
+        return self._data_version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def memoize(self, func=None, key=None):
+        """Decorator caching the figure returned by a callback.
+
+        The returned wrapper has the undecorated callback as `__wrapped__`
+        and computes its cache keys with `cache_key(*args)`.
+
+        Parameters
+        --------
+        key: callable, maps the callback arguments to the part of the cache
+            key identifying the figure, defaults to all arguments
+        """
+        if func is None:
+            return functools.partial(self.memoize, key=key)
+
+        def cache_key(*args):
+            return (func.__name__,) + tuple(args if key is None else key(*args))
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            figure_key = cache_key(*args)
+            if profiling.requested():
+                # render and serialise again, under the profiler
+                self._check_version()
+                with profiling.profile(func.__name__):
+                    with phase('figure'):
+                        output = func(*args)
+                    return self.put(figure_key, output, self._data_version)
+            figure = self.get(figure_key)
+            cache_result(figure is not None)
+            if figure is None:
+                data_version = self._data_version
+                with phase('figure'):
+                    output = func(*args)
+                figure = self.put(figure_key, output, data_version)
+            return figure
+        wrapper.cache_key = cache_key
+        return wrapper
+
+    def _check_version(self):
+        if self.version is None:
+            return
+        version = self.version()
+        if version != self._data_version:
+            with self._lock:
+                if version == self._data_version:
+                    return
+                self._entries.clear()
+                initial = self._data_version is None
+                self._data_version = version
+            if not initial:
+                for listener in self.listeners:
+                    listener(version)
+
+
+def to_json(output):
+    """Serialises a callback output (figure, components or plain values)."""
+    return json.dumps(output, cls=PlotlyJSONEncoder)
+
+
+figure_cache = FigureCache(
+    maxsize=int(os.getenv('FIGURE_CACHE_SIZE', 512)),
+    version=lambda: store.version,
+)
+registry.gauge('figure_cache_entries', 'Figures in the cache of this worker.',
+               lambda: len(figure_cache))
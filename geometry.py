@@ -0,0 +1,210 @@
+# GeoJSON geometry for the choropleth maps
+import json
+import threading
+from collections import defaultdict
+
+from instrumentation import phase
+
+# simplification tolerance per detail level, as fraction of the larger side
+# of the bounding box of the file, so maps of a province and of the country
+# are simplified alike at full view (0.0005 ~ half a pixel of a 1000 px map)
+LEVELS = dict(
+    fine=0.0005,
+    coarse=0.002,
+)
+# decimals kept for coordinates of simplified geometry (5 ~ 1 m)
+PRECISION = 5
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def load(path, level='fine'):
+    """Returns the parsed and simplified GeoJSON of `path`.
+
+    Every file is read and simplified once per process and detail level, the
+    result is shared between all callbacks and must not be modified.
+
+    Parameters
+    --------
+    path: path of a GeoJSON FeatureCollection
+    level: str, key of `LEVELS`, or float tolerance in degrees. A tolerance
+        of 0 or None keeps the full resolution.
+    """
+    key = (str(path), level)
+    geojson = _cache.get(key)
+    if geojson is None:
+        with _lock, phase('load'):
+            geojson = _cache.get(key)
+            if geojson is None:
+                with open(path, 'r') as f:
+                    geojson = json.load(f)
+                tolerance = level
+                if isinstance(level, str):
+                    tolerance = LEVELS[level] * extent(geojson)
+                if tolerance:
+                    geojson = simplify(geojson, tolerance)
+                _cache[key] = geojson
+    return geojson
+
+
+def extent(geojson):
+    """Returns the larger side of the bounding box of a FeatureCollection, in degrees."""
+    xs, ys = [], []
+    for feature in geojson['features']:
+        for polygon in _polygons(feature['geometry']):
+            for ring in polygon:
+                xs.extend(p[0] for p in ring)
+                ys.extend(p[1] for p in ring)
+    if not xs:
+        return 0.0
+    return max(max(xs) - min(xs), max(ys) - min(ys))
+
+
+def simplify(geojson, tolerance, precision=PRECISION):
+    """Topology-preserving Douglas-Peucker simplification of a FeatureCollection.
+
+    Rings are split into arcs at the vertices where neighbouring regions
+    meet, and every arc is simplified once, so borders shared by two
+    regions stay identical and no gaps or overlaps appear between them.
+    Small islands that collapse below a triangle are dropped, other
+    collapsing rings are kept at full resolution.
+
+    Returns a new FeatureCollection, `geojson` is not modified.
+    """
+    features = geojson['features']
+    polygons = [_polygons(feature['geometry']) for feature in features]
+    rings = [_as_points(ring)
+             for feature in polygons for polygon in feature for ring in polygon]
+    junctions = _junctions(rings)
+    arcs = {}
+
+    new_features = []
+    for feature, feature_polygons in zip(features, polygons):
+        new_polygons = []
+        for polygon in feature_polygons:
+            new_polygon = []
+            for i, ring in enumerate(polygon):
+                points = _as_points(ring)
+                new_ring = _simplify_ring(points, junctions, arcs, tolerance)
+                if new_ring is None:
+                    # islands and holes without shared borders can go,
+                    # everything else keeps its original shape
+                    if not any(p in junctions for p in points) and \
+                            (i > 0 or len(feature_polygons) > 1):
+                        if i == 0:
+                            break
+                        continue
+                    new_ring = points + [points[0]]
+                new_polygon.append(
+                    [[round(x, precision), round(y, precision)] for x, y in new_ring])
+            if new_polygon:
+                new_polygons.append(new_polygon)
+        geometry = dict(feature['geometry'])
+        if not new_polygons:
+            new_polygons = feature_polygons
+        if geometry['type'] == 'Polygon':
+            geometry['coordinates'] = new_polygons[0]
+        else:
+            geometry['coordinates'] = new_polygons
+        new_feature = dict(feature)
+        new_feature['geometry'] = geometry
+        new_features.append(new_feature)
+
+    new_geojson = dict(geojson)
+    new_geojson['features'] = new_features
+    return new_geojson
+
+
+def _polygons(geometry):
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    raise ValueError(
+        'Unsupported geometry type {}'.format(geometry['type'])
+    )
+
+
+def _as_points(ring):
+    # open ring of hashable (lon, lat) points
+    points = [(p[0], p[1]) for p in ring]
+    if len(points) > 1 and points[0] == points[-1]:
+        points = points[:-1]
+    return points
+
+
+def _junctions(rings):
+    # vertices with more than two distinct neighbours are where borders of
+    # different regions meet (or a ring touches itself)
+    neighbours = defaultdict(set)
+    for points in rings:
+        n = len(points)
+        for i, point in enumerate(points):
+            neighbours[point].add(points[i - 1])
+            neighbours[point].add(points[(i + 1) % n])
+    return {point for point, other in neighbours.items() if len(other) > 2}
+
+
+def _simplify_ring(points, junctions, arcs, tolerance):
+    if len(points) < 3:
+        return None
+    cuts = [i for i, point in enumerate(points) if point in junctions]
+    if not cuts:
+        # rings without shared borders start at a canonical vertex, so the
+        # same ring in another feature (e.g. a hole) gives the same arc
+        cuts = [points.index(min(points))]
+    start = cuts[0]
+    points = points[start:] + points[:start]
+    cuts = [i - start for i in cuts] + [len(points)]
+    points = points + [points[0]]
+
+    new_ring = [points[0]]
+    for begin, end in zip(cuts, cuts[1:]):
+        new_ring.extend(_simplify_arc(points[begin:end + 1], arcs, tolerance)[1:])
+    if len(set(new_ring)) < 3:
+        return None
+    return new_ring
+
+
+def _simplify_arc(arc, arcs, tolerance):
+    # shared arcs are traversed in opposite directions by the two regions
+    arc = tuple(arc)
+    reverse = arc[::-1]
+    if reverse < arc:
+        return _simplify_arc(reverse, arcs, tolerance)[::-1]
+    simplified = arcs.get(arc)
+    if simplified is None:
+        simplified = douglas_peucker(arc, tolerance)
+        arcs[arc] = simplified
+    return simplified
+
+
+def douglas_peucker(points, tolerance):
+    """Simplifies a polyline, first and last point are always kept."""
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_distance, index = 0.0, None
+        for i in range(first + 1, last):
+            distance = _distance(points[i], points[first], points[last])
+            if distance > max_distance:
+                max_distance, index = distance, i
+        if index is not None and max_distance > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def _distance(point, start, end):
+    # distance of point to the segment start-end
+    x, y = point
+    x1, y1 = start
+    dx, dy = end[0] - x1, end[1] - y1
+    if dx == 0 and dy == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+    return ((x - x1 - t * dx) ** 2 + (y - y1 - t * dy) ** 2) ** 0.5
@@ -0,0 +1,53 @@
+# gunicorn settings of the webapp, see Procfile
+#
+# With preload_app the master process imports app.py once: the datasets
+# (data_store.py), the simplified map geometry (geometry.py) and, with
+# WARMUP=1, the rendered figures (figure_cache.py) are loaded before the
+# workers are forked. The workers share these pages copy-on-write, so each
+# extra worker only costs its own interpreter state and the pages it writes
+# to (new cache entries, reloaded datasets), not another copy of the data.
+#
+# Memory per worker: the size of the shared data is reported by
+# `python data_store.py memory`. The real cost of a worker is its PSS
+# (proportional set size, shared pages split between the processes), e.g.
+#   grep Pss /proc/<pid>/smaps_rollup
+# for the master and every worker. Compare the sum for 1 and n workers,
+# the difference divided by n - 1 is the cost of one more worker.
+#
+# Measured with the Bali data of the repo, synthetic Indonesia and world
+# data (benchmarks/synthetic.py) and WARMUP=1, summing Pss of
+# /proc/<pid>/smaps_rollup after the warm-up: 218 MB for the master and
+# 1 worker, 226 MB for the master and 3 workers, about 4 MB per extra
+# worker instead of a full copy.
+#
+# The runtime of the app (runtime.txt) is python 3.6, which has no
+# gc.freeze (see when_ready): there the garbage collector and reference
+# counting still write to the preloaded objects, so the workers gradually
+# copy the pages they touch and their PSS grows over time.
+import gc
+import os
+
+# the app checks this to load everything at import (see preload in app.py)
+os.environ['APP_PRELOAD'] = '1'
+preload_app = True
+
+# Heroku sets WEB_CONCURRENCY from the dyno size
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+# callbacks of one interaction arrive together, threads serve them in parallel
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+
+def when_ready(server):
+    # keep the garbage collector of the workers from writing to the
+    # preloaded objects, which would copy their pages (python >= 3.7)
+    if hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    # pymongo clients must not be shared across a fork
+    app.mongo.close()
+    app.start_background_tasks(warm_up=False)
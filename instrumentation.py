@@ -0,0 +1,197 @@
+# Timings of the webapp requests, as Server-Timing headers and Prometheus metrics
+import contextlib
+import threading
+import time
+from collections import defaultdict
+
+# phases of a callback, timed exclusive of the phases nested in them
+PHASES = ['load', 'compute', 'figure', 'serialise']
+# upper bounds of the histogram buckets
+SECONDS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BYTES_BUCKETS = [1000, 10000, 50000, 100000, 250000, 500000, 1000000, 5000000]
+
+_local = threading.local()
+
+
+class Registry:
+    """Counters and histograms in the Prometheus text format.
+
+    Only the few metric types used here, so the app does not need
+    prometheus_client. Values are kept per process, every gunicorn worker
+    reports its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+        self._buckets = {}
+        self._gauges = {}  # name -> callable
+
+    def counter(self, name, help):
+        self._help[name] = ('counter', help)
+
+    def histogram(self, name, help, buckets):
+        self._help[name] = ('histogram', help)
+        self._buckets[name] = buckets
+
+    def gauge(self, name, help, func):
+        self._help[name] = ('gauge', help)
+        self._gauges[name] = func
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[(name, _labels(labels))] += value
+
+    def observe(self, name, labels, value):
+        buckets = self._buckets[name]
+        with self._lock:
+            entry = self._histograms.setdefault(
+                (name, _labels(labels)), [[0] * len(buckets), 0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(e[0]), e[1], e[2])
+                          for key, e in self._histograms.items()}
+        lines = []
+        for name, (kind, help) in self._help.items():
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            if kind == 'gauge':
+                lines.append('{} {}'.format(name, self._gauges[name]()))
+            for (key, labels), value in counters.items():
+                if key == name:
+                    lines.append(_sample(name, labels, value))
+            for (key, labels), (counts, total, count) in histograms.items():
+                if key != name:
+                    continue
+                prefix = labels + ',' if labels else ''
+                for bound, bucket in zip(self._buckets[name], counts):
+                    lines.append(_sample(
+                        name + '_bucket', '{}le="{}"'.format(prefix, bound), bucket))
+                lines.append(_sample(
+                    name + '_bucket', '{}le="+Inf"'.format(prefix), count))
+                lines.append(_sample(name + '_sum', labels, total))
+                lines.append(_sample(name + '_count', labels, count))
+        return '\n'.join(lines) + '\n'
+
+
+def _sample(name, labels, value):
+    if labels:
+        return '{}{{{}}} {}'.format(name, labels, value)
+    return '{} {}'.format(name, value)
+
+
+def _labels(labels):
+    return ','.join('{}="{}"'.format(k, str(v).replace('"', '\\"'))
+                    for k, v in sorted(labels.items()))
+
+
+registry = Registry()
+registry.histogram('dash_request_duration_seconds',
+                   'Wall time of callback requests.', SECONDS_BUCKETS)
+registry.histogram('dash_phase_duration_seconds',
+                   'Wall time of the phases of callback requests.', SECONDS_BUCKETS)
+registry.histogram('dash_response_size_bytes',
+                   'Size of callback responses.', BYTES_BUCKETS)
+registry.counter('dash_figure_cache_requests_total',
+                 'Figure cache lookups of callback requests by result.')
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Times a phase of the current request, without the phases nested in it.
+
+    Does nothing outside of a request, e.g. during the warm-up.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        yield
+        return
+    started = time.perf_counter()
+    stack.append(0.0)  # time spent in nested phases
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        _local.timings[name] = _local.timings.get(name, 0.0) + elapsed - nested
+
+
+def cache_result(hit):
+    """Records a figure cache lookup of the current request."""
+    if getattr(_local, 'stack', None) is not None:
+        _local.cache.append('hit' if hit else 'miss')
+
+
+def install(server, path='/metrics', outputs=None):
+    """Times the requests of the Flask `server` and serves the metrics at `path`.
+
+    Every response gets a `Server-Timing` header with the phases of its
+    callback (see `PHASES`), callback requests are aggregated by output.
+
+    Parameters
+    --------
+    outputs: container of the callback outputs of the app (e.g.
+        `app.callback_map`, filled later by the callbacks), the output of
+        a request is only used as label if it is in there, else 'unknown',
+        so made-up requests cannot add series without limit
+    """
+    import flask
+
+    @server.before_request
+    def start_timing():
+        _local.stack = [0.0]
+        _local.timings = {}
+        _local.cache = []
+        _local.started = time.perf_counter()
+
+    @server.after_request
+    def add_timing(response):
+        if getattr(_local, 'stack', None) is None:
+            return response
+        total = time.perf_counter() - _local.started
+        timings, cache = _local.timings, _local.cache
+
+        entries = ['{};dur={:.2f}'.format(name, timings[name] * 1000)
+                   for name in PHASES if name in timings]
+        if cache:
+            entries.append('cache;desc="{}"'.format(','.join(cache)))
+        entries.append('total;dur={:.2f}'.format(total * 1000))
+        response.headers['Server-Timing'] = ', '.join(entries)
+
+        if flask.request.path.endswith('/_dash-update-component'):
+            body = flask.request.get_json(silent=True) or {}
+            output = body.get('output')
+            if not isinstance(output, str) or outputs is None or output not in outputs:
+                output = 'unknown'
+            labels = dict(callback=output)
+            registry.observe('dash_request_duration_seconds', labels, total)
+            for name, seconds in timings.items():
+                registry.observe('dash_phase_duration_seconds',
+                                 dict(labels, phase=name), seconds)
+            if not response.is_streamed:
+                registry.observe('dash_response_size_bytes', labels,
+                                 len(response.get_data()))
+            for result in cache:
+                registry.inc('dash_figure_cache_requests_total',
+                             dict(labels, result=result))
+        return response
+
+    @server.teardown_request
+    def stop_timing(exception):
+        _local.stack = None
+
+    @server.route(path)
+    def metrics():
+        return flask.Response(
+            registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,113 @@
+# Derived metrics of the covid time series
+import numpy as np
+import pandas as pd
+
+# days of the rolling values and of the growth rate
+WINDOW = 7
+
+# dataset name -> (population column, people per unit of that column)
+POPULATION = dict(
+    bali=('population_2015', 1000),  # Bali reference data is in thousands
+    indo=('Population', 1),
+    world=('population', 1),
+)
+
+
+def compute(frame, location, population=None, unit=1):
+    """Returns a copy of `frame` with the derived columns of every location.
+
+    All locations are computed in one grouped, vectorized pass over a
+    frame sorted by location and date (rows of other orders are sorted
+    first). Rows without a date and repeated days of a location get NaN
+    window columns and don't count in the windows. Per-capita columns need the `population` column, columns whose
+    inputs are missing are skipped.
+
+    Columns
+    --------
+    cases7, deaths7: 7-day mean of new cases / deaths
+    cases7_per_100k, deaths7_per_100k: the same per 100k people
+    total_cases_per_100k, total_deaths_per_100k: totals per 100k people
+    new_cases_per_mil: new cases per million people
+    CFR: case fatality ratio in %, deaths among confirmed cases
+        (see https://www.who.int/news-room/commentaries/detail/estimating-mortality-from-covid-19)
+    growth_rate_new_cases: change of new cases against 7 days before
+    """
+    df = frame.sort_values([location, 'Date'], kind='mergesort').copy()
+    # rows without a date and all but the last row of a repeated day stay out
+    # of the windows, their window columns are NaN
+    valid = df[df['Date'].notna() & ~df.duplicated([location, 'Date'], keep='last')]
+    # position of every valid row inside its location
+    codes = valid.groupby(location, sort=False, observed=True).ngroup().to_numpy()
+    starts = np.r_[True, codes[1:] != codes[:-1]]
+    position = np.arange(len(valid)) - np.maximum.accumulate(
+        np.where(starts, np.arange(len(valid)), 0))
+
+    if 'new_cases' in df:
+        df['cases7'] = _rolling_mean(valid['new_cases'], position)
+        filled = valid.groupby(location, sort=False, observed=True)['new_cases'].ffill()
+        previous = _shift(filled, position)
+        df['growth_rate_new_cases'] = (filled / previous - 1).astype(np.float32)
+    if 'new_deaths' in df:
+        df['deaths7'] = _rolling_mean(valid['new_deaths'], position)
+    if 'total_cases' in df and 'total_deaths' in df:
+        df['CFR'] = (df['total_deaths'] / df['total_cases'] * 100).round(2)
+
+    if population is not None and population in df:
+        people = df[population].astype(np.float64) * unit
+        per_100k = 100000 / people
+        for column in ['total_cases', 'total_deaths', 'cases7', 'deaths7']:
+            if column in df:
+                df[column + '_per_100k'] = (df[column] * per_100k).astype(np.float32)
+        if 'new_cases' in df:
+            df['new_cases_per_mil'] = (df['new_cases'] * per_100k * 10).astype(np.float32)
+    return df.loc[frame.index]
+
+
+def append(frame, new_rows, location, population=None, unit=1):
+    """Appends `new_rows` to `frame`, computing derived columns for them only.
+
+    Only the last `WINDOW` days of every location are used as history, so
+    the cost depends on the number of new rows, not on the length of
+    `frame`.
+    """
+    history = frame.dropna(subset=['Date']).groupby(
+        location, observed=True).tail(WINDOW)
+    new_rows = extend(history, new_rows, location, population, unit)
+    new_rows.index = pd.RangeIndex(len(frame), len(frame) + len(new_rows))
+    return pd.concat([frame, new_rows])
+
+
+def extend(history, new_rows, location, population=None, unit=1):
+    """Returns `new_rows` with their derived columns, following `history`.
+
+    `history` must hold at least the last `WINDOW` days of the locations
+    of `new_rows`, e.g. `data_store.Dataset.tail`.
+    """
+    work = pd.concat([history, new_rows], ignore_index=True)
+    work = compute(work, location, population, unit).iloc[len(history):]
+    work.index = new_rows.index
+    return work
+
+
+def _rolling_mean(values, position):
+    # rolling mean of sorted groups from the difference of cumulative sums,
+    # NaN for the first WINDOW - 1 days of every location (like rolling())
+    missing = values.isna().to_numpy()
+    mean = _window_sum(np.where(missing, 0, values.astype(np.float64))) / WINDOW
+    gaps = _window_sum(missing.astype(np.float64))
+    mean[(position < WINDOW - 1) | (gaps > 0)] = np.nan
+    return pd.Series(mean.astype(np.float32), index=values.index)
+
+
+def _window_sum(array):
+    # sum of the last WINDOW values of every row
+    cumsum = np.cumsum(array)
+    return cumsum - np.r_[np.zeros(WINDOW), cumsum[:-WINDOW]][:len(cumsum)]
+
+
+def _shift(values, position):
+    # value WINDOW rows before inside the same location
+    array = values.astype(np.float64).to_numpy()
+    shifted = np.r_[np.full(WINDOW, np.nan), array[:-WINDOW]][:len(array)]
+    shifted[position < WINDOW] = np.nan
+    return pd.Series(shifted, index=values.index)
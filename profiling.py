@@ -0,0 +1,132 @@
+# On-demand profiling of single callback executions
+#
+# Set PROFILE_DIR to enable it. A request with the header `X-Profile` (or the
+# query parameter `profile`) runs its callback under a profiler, bypassing the
+# figure cache, and writes the profile to PROFILE_DIR:
+#   pstats     cProfile statistics (.prof), e.g. `python -m pstats FILE` or snakeviz
+#   collapsed  sampled stacks (.collapsed), input of flamegraph.pl or speedscope
+# The file name is returned in the `X-Profile-File` response header, e.g.
+#   curl -H 'X-Profile: collapsed' -H 'Content-Type: application/json' \
+#        -d @request.json $URL/_dash-update-component
+import contextlib
+import cProfile
+import datetime as dt
+import os
+import pathlib
+import sys
+import threading
+from collections import Counter
+
+FORMATS = ['pstats', 'collapsed']
+# seconds between two samples of the collapsed stacks
+SAMPLE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.001))
+
+_local = threading.local()
+
+
+def requested():
+    """Returns the profile format requested for the current request, or None."""
+    return getattr(_local, 'format', None)
+
+
+@contextlib.contextmanager
+def profile(name):
+    """Profiles the block if the current request asked for it.
+
+    The profile is written to PROFILE_DIR as <time>-<name>-<pid>.<format>.
+    """
+    profile_format = requested()
+    if profile_format is None:
+        yield
+        return
+    path = pathlib.Path(os.environ['PROFILE_DIR'])
+    path.mkdir(parents=True, exist_ok=True)
+    file_name = '{}-{}-{}'.format(
+        dt.datetime.now().strftime('%Y%m%d-%H%M%S-%f'), name, os.getpid())
+
+    if profile_format == 'pstats':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            file_name += '.prof'
+            profiler.dump_stats(str(path.joinpath(file_name)))
+    else:
+        sampler = Sampler(threading.get_ident(), SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            file_name += '.collapsed'
+            sampler.write(path.joinpath(file_name))
+    _local.files.append(file_name)
+
+
+class Sampler(threading.Thread):
+    """Samples the stack of another thread, counting every distinct stack.
+
+    Parameters
+    --------
+    thread_id: int, `threading.get_ident()` of the sampled thread
+    interval: float, seconds between two samples
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(
+                    code.co_name, os.path.basename(code.co_filename),
+                    code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path):
+        """Writes the stacks in the collapsed format, one `stack count` per line."""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+
+def install(server):
+    """Lets requests of the Flask `server` ask for a profile, if PROFILE_DIR is set."""
+    if not os.getenv('PROFILE_DIR'):
+        return
+    import flask
+
+    @server.before_request
+    def start_profile():
+        value = (flask.request.headers.get('X-Profile')
+                 or flask.request.args.get('profile'))
+        _local.format = None
+        _local.files = []
+        if value:
+            _local.format = value if value in FORMATS else FORMATS[0]
+
+    @server.after_request
+    def add_profile_file(response):
+        if getattr(_local, 'files', None):
+            response.headers['X-Profile-File'] = ','.join(_local.files)
+        return response
+
+    @server.teardown_request
+    def stop_profile(exception):
+        _local.format = None
+        _local.files = []
@@ -0,0 +1,181 @@
+# Registry of the regencies and provinces: names, aliases, map ids, reference data
+import json
+import os
+import pathlib
+import re
+
+import pandas as pd
+
+from data_store import DATA_PATH
+
+# names of the sources and data that differ from the canonical name
+ALIASES = dict(
+    regency={
+        'Kota denpasar': 'Denpasar',
+        'Kota Denpasar': 'Denpasar',
+        'KABUPATEN LAIN': 'Others',
+    },
+    # province names of the Kaggle / kawalCovid data -> names of the map
+    province={
+        'DKI Jakarta': 'Jakarta Raya',
+        'Papua Barat': 'Irian Jaya Barat',
+        'Daerah Istimewa Yogyakarta': 'Yogyakarta',
+        'Kepulauan Bangka Belitung': 'Bangka-Belitung',
+    },
+)
+# source links of the reference data, not data
+REFERENCE_DROP_COLUMNS = [
+    'https://en.wikipedia.org/wiki/Bali#cite_note-BPS2019-2',
+    'https://sp2010.bps.go.id/index.php/site/tabel?tid=321&wid=0', 'Source']
+SOURCES = dict(
+    reference='Bali_reference_data.xlsx',
+    bali_geojson='new_bali_id.geojson',
+    indo_geojson='new_indo_id.geojson',
+)
+CACHE = 'regions.cache.json'
+
+
+class RegionRegistry:
+    """Canonical names, map ids and reference data of the regions.
+
+    Names of any source are matched case and whitespace insensitive, to
+    the canonical name or one of its aliases, in one vectorized lookup.
+
+    Parameters
+    --------
+    regions: DataFrame, one row per region with the columns `level`
+        ('regency' or 'province'), `Name_EN` (canonical name), `id`
+        (feature id of the map geometry) and the reference data columns
+    aliases: dict, level -> {alias: canonical name}
+    """
+
+    def __init__(self, regions, aliases=None):
+        self.regions = regions
+        self._keys = {}
+        for level, group in regions.groupby('level'):
+            keys = {normalise_key(name): name for name in group['Name_EN']}
+            for column in ('Name_Indo', 'name_geometry'):
+                if column in group:
+                    keys.update({normalise_key(alias): name for alias, name in
+                                 zip(group[column], group['Name_EN']) if isinstance(alias, str)})
+            keys.update({normalise_key(alias): name for alias, name in
+                         (aliases or ALIASES).get(level, {}).items()})
+            self._keys[level] = keys
+
+    @classmethod
+    def build(cls, reference, bali_geojson, indo_geojson):
+        """Builds the registry from the reference Excel and the GeoJSON files."""
+        regencies = read_reference(reference)
+        names = {normalise_key(n): n for n in regencies['Name_EN']}
+        features = _features(bali_geojson, 'ADM2_EN')
+        features['Name_EN'] = features['name_geometry'].map(
+            lambda n: names.get(normalise_key(ALIASES['regency'].get(n, n)), n))
+        regencies = regencies.merge(features, on='Name_EN', how='outer')
+        regencies['level'] = 'regency'
+
+        provinces = _features(indo_geojson, 'state')
+        provinces['Name_EN'] = provinces['name_geometry']
+        provinces['level'] = 'province'
+        regions = pd.concat([regencies, provinces], ignore_index=True, sort=False)
+        regions['id'] = regions['id'].fillna(0).astype(int)
+        return cls(regions)
+
+    @classmethod
+    def load(cls, data_path=DATA_PATH, cache=True):
+        """Returns the registry of the files in `data_path`.
+
+        The registry is cached in `CACHE` and only built again when one of
+        the sources changed, so the Excel and GeoJSON files are not parsed
+        on every run.
+        """
+        data_path = pathlib.Path(data_path)
+        sources = {key: data_path.joinpath(name) for key, name in SOURCES.items()}
+        mtimes = {key: os.stat(path).st_mtime_ns for key, path in sources.items()}
+        cache_path = data_path.joinpath(CACHE)
+        if cache and cache_path.exists():
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached['sources'] == mtimes:
+                return cls(pd.DataFrame(cached['data'], columns=cached['columns']))
+        registry = cls.build(**sources)
+        if cache:
+            tmp = cache_path.with_name(cache_path.name + '.tmp')
+            regions = registry.regions.astype(object).where(registry.regions.notna(), None)
+            with open(tmp, 'w') as f:
+                json.dump(dict(sources=mtimes, columns=list(regions.columns),
+                               data=regions.values.tolist()), f)
+            os.replace(tmp, cache_path)
+        return registry
+
+    def normalise(self, names, level):
+        """Returns the canonical names of a Series of names.
+
+        Unknown names are kept, capitalized like the regency names of the
+        Bali data (e.g. 'KABUPATEN LAINNYA' -> 'Kabupaten lainnya').
+        """
+        keys = names.astype(str).map(normalise_key)
+        canonical = keys.map(self._keys[level])
+        fallback = names.astype(str).str.strip()
+        if level == 'regency':
+            fallback = fallback.str.capitalize()
+        return canonical.fillna(fallback)
+
+    def join(self, frame, column, level, columns=None):
+        """Adds the registry columns of the regions in `frame[column]`.
+
+        `column` must hold canonical names (see `normalise`), regions
+        missing in the registry get id 0.
+
+        Parameters
+        --------
+        columns: list, registry columns to add, defaults to all with data
+            of the level
+        """
+        regions = self.regions[self.regions['level'] == level].dropna(axis=1, how='all')
+        if columns is None:
+            columns = [c for c in regions.columns
+                       if c not in ('level', 'Name_EN', 'name_geometry') and c not in frame]
+        regions = regions[['Name_EN'] + columns].rename(columns={'Name_EN': column})
+        merged = frame.merge(regions, on=column, how='left')
+        if 'id' in columns:
+            merged['id'] = merged['id'].fillna(0).astype(int)
+        merged.index = frame.index
+        return merged
+
+    def ids(self, level):
+        """Returns canonical name -> map id of a level."""
+        regions = self.regions[self.regions['level'] == level]
+        return dict(zip(regions['Name_EN'], regions['id']))
+
+
+def normalise_key(name):
+    # lookup key of a name, case and whitespace insensitive
+    return re.sub(r'\s+', ' ', str(name)).strip().casefold()
+
+
+def read_reference(path):
+    """Reads the reference data of the regencies (population in thousands, area, ...).
+
+    The totals row of Bali is left out, its numbers are in people.
+    """
+    reference = pd.read_excel(path)
+    reference = reference.drop(columns=REFERENCE_DROP_COLUMNS, errors='ignore')
+    reference = reference[~reference['Name_Indo'].str.casefold().eq('totals')]
+    reference['Name_EN'] = reference['Name_Indo'].str.capitalize().replace(
+        ALIASES['regency'])
+    for column in reference.columns:
+        try:
+            reference[column] = pd.to_numeric(reference[column])
+        except (ValueError, TypeError):
+            pass
+    return reference.reset_index(drop=True)
+
+
+def _features(path, name_property):
+    # id and name of every feature of a GeoJSON file
+    with open(path, 'r') as f:
+        geojson = json.load(f)
+    return pd.DataFrame(
+        [(int(feature['id']), feature['properties'][name_property])
+         for feature in geojson['features']],
+        columns=['id', 'name_geometry'])
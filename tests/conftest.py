@@ -0,0 +1,55 @@
+# Fixtures of the tests, run with `python -m pytest` from the repo folder
+import json
+import pathlib
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from etl import TABLE_ROWS  # noqa: E402
+from regions import RegionRegistry  # noqa: E402
+
+REGENCIES = ['Badung', 'Bangli', 'Buleleng', 'Denpasar', 'Gianyar',
+             'Jembrana', 'Karangasem', 'Klungkung', 'Tabanan']
+
+
+@pytest.fixture
+def registry():
+    """Registry of the Bali regencies, without the reference files."""
+    return RegionRegistry(pd.DataFrame(dict(
+        level='regency', Name_EN=REGENCIES, id=range(1, len(REGENCIES) + 1),
+        population_2015=[100 * (i + 1) for i in range(len(REGENCIES))])))
+
+
+def spider_records(dates):
+    """Returns the records the spider writes for `dates`, two tables per day.
+
+    laporan-harian-01 (transmission numbers) comes first, then
+    laporan-harian-02 (cases), see etl.read_records.
+    """
+    records = []
+    names = [name.upper() for name in REGENCIES] + ['KABUPATEN LAINNYA']
+    for day, date in enumerate(dates):
+        date = pd.Timestamp(date).strftime('%Y-%m-%d')
+        second, first = [], []
+        for no, name in enumerate(names[:TABLE_ROWS], 1):
+            new = (day * 7 + no * 3) % 11
+            total = sum((d * 7 + no * 3) % 11 for d in range(day + 1))
+            second.append(dict(No=no, county=name, ppln=0, ppln_total=0,
+                               ppdn=1, ppdn_total=day + 1, local=new, local_total=total,
+                               other=0, other_total=0, new_cases=new,
+                               total_cases=total, Date=date))
+            first.append(dict(No=no, county=name, treatment=new, treatment_total=total,
+                              recovered=0, recovered_total=day, deaths=no % 2,
+                              deaths_total=(day + 1) * (no % 2), new_cases=new,
+                              total_cases=total, Date=date))
+        records += [dict(data=second), dict(data=first)]
+    return records
+
+
+def write_lines(path, records, mode='w'):
+    with open(path, mode) as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
@@ -0,0 +1,38 @@
+import pandas as pd
+import pandas.testing as pdt
+
+from data_store import Dataset
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['Date', 'Name_EN', 'id', 'new_cases'])
+
+
+BASE = frame([
+    ('2021-01-01', 'Badung', 1, 1), ('2021-01-02', 'Badung', 1, 2),
+    (None, 'Bangli', 2, 0), ('2021-01-01', 'Bangli', 2, 3),
+    ('2021-01-01', 'Tabanan', 9, 4), ('2021-01-03', 'Tabanan', 9, 5),
+])
+
+
+def test_append_inserts_rows_like_a_rebuild():
+    new = frame([('2021-01-04', 'Tabanan', 9, 6), ('2021-01-04', 'Badung', 1, 7),
+                 ('2021-01-05', 'Badung', 1, 8), ('2021-01-04', 'Gianyar', 5, 9)])
+    new['Date'] = pd.to_datetime(new['Date'])
+    appended = Dataset(None, BASE, 'Name_EN').append(new)
+    rebuilt = Dataset(None, pd.concat([BASE, new], ignore_index=True), 'Name_EN')
+
+    # new locations go last instead of in order of their name
+    assert set(appended.index) == set(rebuilt.index)
+    for location, rows in rebuilt.index.items():
+        pdt.assert_frame_equal(
+            appended.frame.iloc[appended.index[location]].reset_index(drop=True),
+            rebuilt.frame.iloc[rows].reset_index(drop=True), check_categorical=False)
+    pdt.assert_frame_equal(appended.latest, rebuilt.latest, check_categorical=False)
+
+
+def test_append_of_older_days_rebuilds():
+    new = frame([('2021-01-02', 'Tabanan', 9, 6)])
+    appended = Dataset(None, BASE, 'Name_EN').append(new)
+    rows = appended.frame.iloc[appended.index['Tabanan']]
+    assert rows['Date'].dt.day.tolist() == [1, 2, 3]
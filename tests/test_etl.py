@@ -0,0 +1,114 @@
+import json
+
+import pandas as pd
+import pandas.testing as pdt
+
+from conftest import spider_records, write_lines
+from data_store import dataset_path, read_dataset
+from etl import (FIRST_TABLE_COLUMNS, SECOND_TABLE_COLUMNS, TABLE_ROWS,
+                 BaliPipeline, parse_tables, read_records)
+
+DATES = pd.date_range('2021-03-01', periods=30)
+
+
+def test_read_records_skips_broken_lines(tmp_path):
+    path = tmp_path.joinpath('daily.jl')
+    path.write_bytes(b'{"a": 1}\n{"a": \n{"a": 2}\n')
+    records = list(read_records(path))
+    assert [(number, record) for number, _, record in records] == [(1, {'a': 1}), (2, {'a': 2})]
+    assert records[-1][1] == path.stat().st_size
+
+
+def test_read_records_leaves_unterminated_line(tmp_path):
+    path = tmp_path.joinpath('daily.jl')
+    path.write_bytes(b'{"a": 1}\n{"a": 2')
+    assert [record for _, _, record in read_records(path)] == [{'a': 1}]
+
+
+def test_read_records_resumes_at_offset(tmp_path):
+    path = tmp_path.joinpath('daily.jl')
+    path.write_bytes(b'{"a": 1}\n{"a": 2}\n')
+    number, offset, _ = next(read_records(path))
+    with open(path, 'ab') as f:
+        f.write(b'{"a": 3}\n')
+    resumed = list(read_records(path, offset, number))
+    assert [(n, record) for n, _, record in resumed] == [(2, {'a': 2}), (3, {'a': 3})]
+
+
+def test_parse_tables_assigns_odd_and_even_records():
+    records = spider_records(DATES[:2])
+    first, second = parse_tables(enumerate(records, 1))
+    assert list(first.columns) == FIRST_TABLE_COLUMNS
+    assert list(second.columns) == SECOND_TABLE_COLUMNS
+    assert len(first) == len(second) == 2 * TABLE_ROWS
+    # even records are laporan-harian-02, its treatment column
+    assert first['new_treatment'].tolist() == [
+        row['treatment'] for record in records[1::2] for row in record['data']]
+    assert second['new_local_transmission'].tolist() == [
+        row['local'] for record in records[::2] for row in record['data']]
+
+
+def test_checkpoint_after_complete_pairs(tmp_path, registry):
+    source = tmp_path.joinpath('daily.jl')
+    records = spider_records(DATES[:3])
+    # the third day has only its first table yet
+    write_lines(source, records[:5])
+    pipeline = BaliPipeline(source, tmp_path, registry)
+    pipeline.run()
+
+    state = pipeline.load_state()
+    assert state['count'] == 4
+    assert state['offset'] == len(''.join(
+        json.dumps(r) + '\n' for r in records[:4]).encode())
+    frame = read_dataset(dataset_path(pipeline.path))
+    assert frame['Date'].max() == DATES[1]
+
+    write_lines(source, records[5:], mode='a')
+    pipeline.run()
+    assert pipeline.load_state()['count'] == 6
+    frame = read_dataset(dataset_path(pipeline.path))
+    assert frame['Date'].max() == DATES[2]
+    assert len(frame) == 3 * TABLE_ROWS
+
+
+def test_incremental_runs_equal_full_run(tmp_path, registry):
+    records = spider_records(DATES)
+    incremental = tmp_path.joinpath('incremental')
+    incremental.mkdir()
+    source = incremental.joinpath('daily.jl')
+    pipeline = BaliPipeline(source, incremental, registry)
+    for start, end in [(0, 20), (20, 41), (41, 60)]:
+        write_lines(source, records[start:end], mode='a')
+        pipeline.run()
+
+    full = tmp_path.joinpath('full')
+    full.mkdir()
+    write_lines(full.joinpath('daily.jl'), records)
+    full_pipeline = BaliPipeline(full.joinpath('daily.jl'), full, registry)
+    full_pipeline.run(full=True)
+
+    def rows(pipeline):
+        frame = read_dataset(dataset_path(pipeline.path))
+        return frame.sort_values(['Date', 'No']).reset_index(drop=True)
+
+    pdt.assert_frame_equal(rows(pipeline), rows(full_pipeline))
+
+
+def test_missing_dataset_reads_the_whole_source(tmp_path, registry):
+    source = tmp_path.joinpath('daily.jl')
+    records = spider_records(DATES[:4])
+    write_lines(source, records[:4])
+    pipeline = BaliPipeline(source, tmp_path, registry)
+    pipeline.run()
+    # the dataset is gone, the checkpoint is left
+    for path in tmp_path.glob(pipeline.path.name + '.*'):
+        if path != pipeline.state_path:
+            path.unlink()
+    tmp_path.joinpath('manifest.json').unlink()
+    assert pipeline.state_path.exists()
+
+    write_lines(source, records[4:], mode='a')
+    pipeline.run()
+    frame = read_dataset(dataset_path(pipeline.path))
+    assert sorted(frame['Date'].unique()) == list(DATES[:4])
+    assert pipeline.load_state()['count'] == 8
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+import metrics
+
+DATES = pd.date_range('2021-01-01', periods=20)
+
+
+def frame(location, dates, new_cases):
+    return pd.DataFrame(dict(Date=dates, Name_EN=location, new_cases=new_cases))
+
+
+def test_compute_skips_rows_without_date_and_repeated_days():
+    cases = np.arange(20, dtype=np.float64) % 5
+    clean = pd.concat([frame('Badung', DATES, cases),
+                       frame('Denpasar', DATES, cases * 2)], ignore_index=True)
+    # a row without a date and a repeated day, the last one counts
+    broken = pd.concat([clean, frame('Denpasar', [pd.NaT, DATES[10]], [100.0, 200.0])],
+                       ignore_index=True)
+    broken.loc[30, 'new_cases'] = -1
+
+    expected = metrics.compute(clean.assign(new_cases=clean['new_cases'].where(
+        clean.index != 30, 200.0)), 'Name_EN')
+    result = metrics.compute(broken, 'Name_EN')
+
+    windows = ['cases7', 'growth_rate_new_cases']
+    kept = clean.index.drop(30)
+    pdt.assert_frame_equal(result.loc[kept, windows], expected.loc[kept, windows])
+    pdt.assert_series_equal(result.loc[41, windows], expected.loc[30, windows],
+                            check_names=False)
+    assert result.loc[[30, 40], windows].isna().all().all()
+    assert len(result) == len(broken)
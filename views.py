@@ -0,0 +1,127 @@
+# Per-selection view models shared by the webapp callbacks
+import threading
+from collections import OrderedDict
+
+from data_store import store
+from instrumentation import phase
+
+# columns of the fun facts table
+FUN_FACT_COLUMNS = ['Date', 'location', 'median_age',
+                    'aged_65_older', 'male_smokers', 'female_smokers', 'diabetes_prevalence']
+# days shown in the vaccination graph
+VACCINATION_DAYS = 100
+
+
+class ViewCache:
+    """LRU cache computing every view once per key and data version.
+
+    Callbacks fired by the same interaction run in parallel; the first one
+    computes the view while the others wait for it on a per-key lock
+    instead of repeating the work. Keys come from the values the browser
+    sends, so at most `maxsize` views are kept, the least recently used
+    are dropped.
+
+    Parameters
+    --------
+    version: callable returning the current data version
+    maxsize: int, number of views kept
+    """
+
+    def __init__(self, version, maxsize=256):
+        self.version = version
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (data version, view)
+        self._key_locks = {}  # key -> [lock, number of threads using it]
+        self._lock = threading.Lock()
+
+    def get(self, key, make):
+        version = self.version()
+        entry = self._lookup(key, version)
+        if entry is not None:
+            return entry[1]
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                entry = self._lookup(key, version)
+                if entry is None:
+                    with phase('compute'):
+                        entry = (version, make())
+                    with self._lock:
+                        self._entries[key] = entry
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.maxsize:
+                            self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self._key_locks[key]
+        return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+
+view_cache = ViewCache(lambda: store.version)
+
+
+def region_view(region, regency):
+    """Returns the data of the region selected in the control panel.
+
+    dict with
+    name: str, 'Indonesia', 'Bali' or the regency
+    series: DataFrame, date-sorted rows of the region
+    latest: Series, most recent row of the region
+    """
+    return view_cache.get(
+        ('region', region, regency), lambda: _region_view(region, regency))
+
+
+def compare_view(country):
+    """Returns the world data of a country (or 'World').
+
+    dict with
+    name: str, the country
+    series: DataFrame, date-sorted rows of the country
+    latest: Series, most recent row of the country
+    vaccinations: DataFrame, rows of the last `VACCINATION_DAYS` days
+    fun_facts: DataFrame, latest row of `FUN_FACT_COLUMNS`, rounded
+    """
+    return view_cache.get(('compare', country), lambda: _compare_view(country))
+
+
+def _region_view(region, regency):
+    if region == 'indo':
+        name = 'Indonesia'
+        series = store.location('world', name)   # use owid_world data
+    elif region == 'bali' and regency == '' or regency == None:
+        name = 'Bali'
+        series = store.location('indo', name)
+    else:
+        name = str(regency)
+        series = store.location('bali', name.capitalize())
+    return dict(name=name, series=series, latest=series.iloc[-1])
+
+
+def _compare_view(country):
+    series = store.location('world', str(country))
+    fun_facts = series[FUN_FACT_COLUMNS].iloc[-1:].round(1)
+    fun_facts['Date'] = fun_facts['Date'].dt.strftime('%Y-%m-%d')
+    return dict(
+        name=country,
+        series=series,
+        latest=series.iloc[-1],
+        vaccinations=series.iloc[-VACCINATION_DAYS:],
+        fun_facts=fun_facts,
+    )
@@ -0,0 +1,121 @@
+# Pre-rendering of all callback outputs for the webapp
+import importlib
+import itertools
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from controls import REGENCIES, REGIONS, COMPARE_COUNTRIES, CASE_TYPES
+from figure_cache import figure_cache, to_json
+
+logger = logging.getLogger(__name__)
+
+
+def combinations():
+    """Yields (callback name, args) for every combination of the controls."""
+    # '' is the initial value of the regency dropdown, None a cleared one
+    regencies = ['', None] + list(REGENCIES.values())
+    # numbers of all info boxes, sent to the page by update_summary
+    yield 'info_summary', ()
+    for region, regency, compare_with in itertools.product(
+            REGIONS, regencies, COMPARE_COUNTRIES):
+        yield 'make_count_figure', (region, regency, compare_with)
+    for region, case_type in itertools.product(REGIONS, CASE_TYPES):
+        yield 'make_main_figure', (region, case_type)
+        yield 'make_regency_info_fig', (region, case_type)
+    for compare_with in COMPARE_COUNTRIES:
+        yield 'make_vacc_graph', (compare_with,)
+        yield 'fun_facts', (compare_with,)
+
+
+def warm_up(module, processes=None):
+    """Renders every callback output of `module` into the figure cache.
+
+    Parameters
+    --------
+    module: str, name of the module defining the memoized callbacks
+    processes: int, optional, render in a pool of this many processes
+        instead of the calling thread. Only for a process without other
+        threads (the preload before gunicorn forks): the pool forks, since
+        python 3.6 cannot choose spawn, and a fork copies the locks held by
+        other threads, which then never get released in the children.
+
+    Returns
+    --------
+    int, number of outputs stored
+    """
+    data_version = figure_cache.data_version()
+    jobs = list(combinations())
+    if processes and processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            results = pool.map(
+                _render, itertools.repeat(module), *zip(*jobs), chunksize=8)
+            results = list(results)
+    else:
+        results = [_render(module, name, args) for name, args in jobs]
+
+    count = 0
+    for result in results:
+        if result is not None:
+            figure_cache.put_json(*result, data_version=data_version)
+            count += 1
+    return count
+
+
+def start(module, now=True):
+    """Warms up the cache in a background thread, and again after data changed.
+
+    The outputs are rendered in that thread, see `warm_up` for the pool.
+    Changes during a warm-up are coalesced: at most one warm-up runs and
+    one more is queued behind it. With `now` False the first warm-up is
+    skipped, e.g. when the cache was filled before the process was forked.
+
+    Returns
+    --------
+    the warm-up thread, None when no new thread was started
+    """
+    lock = threading.Lock()
+    state = dict(running=False, queued=False)
+
+    def loop():
+        while True:
+            try:
+                _run(module)
+            except Exception:
+                logger.exception('warm-up failed')
+            with lock:
+                if not state['queued']:
+                    state['running'] = False
+                    return
+                state['queued'] = False
+
+    def run():
+        with lock:
+            if state['running']:
+                state['queued'] = True
+                return None
+            state['running'] = True
+        thread = threading.Thread(target=loop, name='warmup', daemon=True)
+        thread.start()
+        return thread
+
+    # listeners get the new data version, the warm-up reads it itself
+    figure_cache.listeners.append(lambda version: run())
+    return run() if now else None
+
+
+def _run(module):
+    count = warm_up(module)
+    logger.info('warm-up rendered %s callback outputs', count)
+
+
+def _render(module, name, args):
+    callback = getattr(importlib.import_module(module), name)
+    try:
+        figure = callback.__wrapped__(*args)
+    except Exception:
+        # e.g. a compare country missing in the data, the callback fails
+        # the same way when a visitor selects it
+        logger.exception('warm-up of %s%s failed', name, args)
+        return None
+    return callback.cache_key(*args), to_json(figure)